@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Benchmarks for validating data against types.
+
+Validates synthetic data generated for a set of schemas (covering records,
+tuples, unions, generic applications, arrays and maps, as well as schemas
+built from the django and gae samples) at different payload sizes, with
+both checkers.type_check and checkers.compile.  Throughput, latency
+percentiles and peak memory are reported and can be saved as JSON and
+compared between runs:
+
+    python benchmarks/bench_type_check.py --output before.json
+    ... make changes ...
+    python benchmarks/bench_type_check.py --output after.json
+    python benchmarks/bench_type_check.py --compare before.json after.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+
+from typecube.core import *
+from typecube import defaults
+from typecube import checkers
+from typecube import errors
+from typecube import loader
+
+DEFAULT_SIZES = [10, 1000, 100000]
+
+def bool_validator(thetype, val, bindings = None):
+    if type(val) is not bool:
+        raise errors.ValidationError("%s needs to be a bool, found %s" % (str(val), str(type(val))))
+    return val
+bool_validator.python_type = bool
+
+Boolean = NativeType("boolean").set_validator(bool_validator)
+
+class Generator(object):
+    """ Generates valid values for a type.  Arrays and maps get
+    collection_size elements. """
+    def __init__(self, collection_size = 3, seed = 42):
+        self.random = random.Random(seed)
+        self.collection_size = collection_size
+
+    def value(self, thetype):
+        if isinstance(thetype, RecordType):
+            return dict((name, self.value(child)) for name,child in zip(thetype.child_names, thetype.child_types))
+        elif isinstance(thetype, TupleType):
+            return tuple(self.value(child) for child in thetype.child_types)
+        elif isinstance(thetype, UnionType):
+            index = self.random.randrange(len(thetype.child_types))
+            return {thetype.child_names[index]: self.value(thetype.child_types[index])}
+        elif isinstance(thetype, TypeApp):
+            root_type = thetype.root_type
+            mapper_functor = getattr(root_type, "mapper_functor", None)
+            if mapper_functor is defaults.default_array_mapper_functor:
+                element_type = thetype.param_values["T"]
+                return [self.value(element_type) for i in range(self.collection_size)]
+            elif mapper_functor is defaults.default_dict_mapper_functor:
+                key_type, value_type = thetype.param_values["K"], thetype.param_values["V"]
+                return dict((self.value(key_type), self.value(value_type)) for i in range(self.collection_size))
+            return self.value(thetype.concrete)
+        python_type = getattr(thetype.validator, "python_type", None)
+        if python_type is int:
+            return self.random.randint(-2**31, 2**31)
+        elif python_type is float:
+            return self.random.random() * 1000
+        elif python_type is bool:
+            return self.random.random() < 0.5
+        elif python_type is str:
+            return "".join(self.random.choice("abcdefghijklmnopqrstuvwxyz") for i in range(8))
+        return None
+
+def construct_schemas():
+    """ Returns a dict of name to type for each of the constructs. """
+    Flat = RecordType("Flat")
+    for index in range(10):
+        Flat.add([defaults.Int, defaults.Float, defaults.String][index % 3], "field%d" % index)
+    Triple = TupleType("Triple").add(defaults.Int).add(defaults.Float).add(defaults.String)
+    Event = UnionType("Event")
+    for index in range(10):
+        Event.add(RecordType("Event%d" % index).add(defaults.Int, "id").add(defaults.String, "payload%d" % index), "event%d" % index)
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    return {
+        "record": Flat,
+        "tuple": Triple,
+        "union": Event,
+        "generic": defaults.Map[defaults.String, defaults.List[Pair[defaults.Int, defaults.Array[defaults.String]]]],
+    }
+
+def collection_schemas():
+    """ Returns a dict of name to type for collections of natives. """
+    return {
+        "array_int": defaults.Array[defaults.Int],
+        "array_double": defaults.Array[defaults.Double],
+        "map_string_int": defaults.Map[defaults.String, defaults.Int],
+    }
+
+def gae_schema():
+    """ An entity built out of the types in samples/gae/types.tc """
+    root = loader.load_file(os.path.join(ROOT_DIR, "samples", "gae", "types.tc"))
+    types = root.ensure("onering.gae.types").types
+    # The other atomics are bound to the defaults by the loader
+    types["Date"].set_validator(defaults.default_string_validator)
+    return RecordType("Entity")                                     \
+                .add(types["Key"], "key")                           \
+                .add(types["User"], "owner")                        \
+                .add(types["GeoPt"], "location")                    \
+                .add(types["PostalAddress"], "address")             \
+                .add(types["PhoneNumber"], "phone")                 \
+                .add(types["Rating"], "rating")                     \
+                .add(types["ShortBlob"], "thumbnail")               \
+                .add(types["Array"][types["Category"]], "categories")
+
+def django_schema():
+    """ A model built out of (a subset of) the field records in
+    samples/django/types.tc.  The sample uses syntax the loader does not
+    support so the records are built here. """
+    String, Int = defaults.String, defaults.Int
+    def field(name, *extra):
+        record = RecordType(name)                   \
+                    .add(Boolean, "null")           \
+                    .add(Boolean, "blank")          \
+                    .add(String, "db_column")       \
+                    .add(Boolean, "index")          \
+                    .add(Boolean, "editable")       \
+                    .add(String, "help_text")       \
+                    .add(Boolean, "primary_key")    \
+                    .add(Boolean, "unique")         \
+                    .add(String, "verbose_name")
+        for child_type, child_name in extra:
+            record.add(child_type, child_name)
+        return record
+    Choice = TupleType(None).add(String).add(String)
+    CharField = field("CharField", (Int, "max_length"), (defaults.Array[Choice], "choices"))
+    DateField = field("DateField", (Boolean, "auto_now"), (Boolean, "auto_now_add"))
+    DecimalField = field("DecimalField", (Int, "max_digits"), (Int, "decimal_places"))
+    ForeignKey = field("ForeignKey", (TypeVar("T"), "to"), (String, "related_name"),
+                       (defaults.Map[String, String], "limit_choices_to"))
+    ForeignKey.args = ["T"]
+    ModelRef = RecordType("ModelRef").add(String, "app").add(String, "model")
+    return RecordType("Model")                                  \
+                .add(String, "name")                            \
+                .add(CharField, "title")                        \
+                .add(CharField, "slug")                         \
+                .add(DateField, "created")                      \
+                .add(DecimalField, "price")                     \
+                .add(ForeignKey[ModelRef], "owner")
+
+def cases(sizes):
+    """ Yields (name, type, size, values) for each benchmark.  For records
+    size is the number of values, for collections it is the number of
+    elements in the (single) value. """
+    schemas = construct_schemas()
+    schemas["gae"] = gae_schema()
+    schemas["django"] = django_schema()
+    for size in sizes:
+        generator = Generator()
+        for name,thetype in schemas.items():
+            yield name, thetype, size, [generator.value(thetype) for i in range(size)]
+        generator = Generator(size)
+        for name,thetype in collection_schemas().items():
+            yield name, thetype, size, [generator.value(thetype)]
+
+def engines():
+    return {
+        "type_check": lambda thetype: (lambda value: checkers.type_check(thetype, value)),
+        "compile": checkers.compile,
+    }
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure(check, values, min_time):
+    """ Validates all values repeatedly (for at least min_time seconds)
+    timing each validation. """
+    latencies = []
+    started = time.perf_counter()
+    while not latencies or time.perf_counter() - started < min_time:
+        for value in values:
+            start = time.perf_counter()
+            check(value)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    total = sum(latencies)
+    tracemalloc.start()
+    for value in values:
+        check(value)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "values": len(latencies),
+        "throughput": len(latencies) / total if total else None,
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p99": percentile(latencies, 0.99),
+        "peak_memory": peak_memory,
+    }
+
+def run(sizes, min_time, only = None):
+    results = []
+    for name,thetype,size,values in cases(sizes):
+        if only and name not in only: continue
+        for engine_name,make_check in engines().items():
+            result = {"name": name, "engine": engine_name, "size": size}
+            try:
+                result.update(measure(make_check(thetype), values, min_time))
+            except Exception as exc:
+                result["error"] = "%s: %s" % (exc.__class__.__name__, exc)
+            results.append(result)
+            print(format_result(result))
+    return results
+
+def format_result(result):
+    if "error" in result:
+        return "%-16s %-10s %8d  ERROR %s" % (result["name"], result["engine"], result["size"], result["error"])
+    return "%-16s %-10s %8d  %12.1f/s  p50 %9.2fus  p99 %9.2fus  peak %10d B" % (
+                result["name"], result["engine"], result["size"], result["throughput"],
+                result["p50"] * 1e6, result["p99"] * 1e6, result["peak_memory"])
+
+def metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = ROOT_DIR,
+                                         stderr = subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(),
+            "platform": platform.platform(), "time": time.time()}
+
+def compare(before_path, after_path):
+    """ Prints the change in throughput and p99 latency between two runs. """
+    with open(before_path) as infile: before = json.load(infile)
+    with open(after_path) as infile: after = json.load(infile)
+    key = lambda result: (result["name"], result["engine"], result["size"])
+    previous = dict((key(result), result) for result in before["results"])
+    print("%-16s %-10s %8s  %12s  %12s" % ("name", "engine", "size", "throughput", "p99"))
+    for result in after["results"]:
+        old = previous.get(key(result))
+        if old is None or "error" in old or "error" in result:
+            change = "n/a"
+            print("%-16s %-10s %8d  %12s  %12s" % (key(result) + (change, change)))
+            continue
+        print("%-16s %-10s %8d  %11.2fx  %11.2fx" % (key(result) + (result["throughput"] / old["throughput"],
+                                                                    result["p99"] / old["p99"])))
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks type checking")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = DEFAULT_SIZES)
+    parser.add_argument("--min-time", type = float, default = 0.2, help = "Minimum seconds per benchmark")
+    parser.add_argument("--only", nargs = "+", help = "Only run the named benchmarks")
+    parser.add_argument("--output", help = "Save results as JSON to this file")
+    parser.add_argument("--compare", nargs = 2, metavar = ("BEFORE", "AFTER"), help = "Compare two saved results")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args.sizes, args.min_time, args.only)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump({"meta": metadata(), "results": results}, outfile, indent = 2)
+
+if __name__ == "__main__":
+    main()
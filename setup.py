@@ -41,7 +41,7 @@ setup(name='typecube',
       author='Sriram Panyam',
       author_email='sri.panyam@gmail.com',
       requires = ["enum34", "ipdb", "wheel", "PyYaml" ],
-      extras_require={'docs': ['Sphinx>=1.1']},
+      extras_require={'docs': ['Sphinx>=1.1'], 'columnar': ['numpy']},
       keywords=['languages', 'type system', 'types'],
       url='https://github.com/panyam/typecube',
       long_description=get_description(),
@@ -0,0 +1,40 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube.aio import async_type_check
+
+Item = RecordType("Item").add(defaults.String, "name").add(defaults.Float, "price")
+Items = defaults.Array[Item]
+
+def items(count):
+    return [{"name": "x", "price": 1.0} for i in range(count)]
+
+def test_async_type_check_yields():
+    ticks = []
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0)
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        await async_type_check(Items, items(10000), batch_size = 100)
+        task.cancel()
+    asyncio.run(main())
+    # The ticker got to run while the items were checked
+    assert len(ticks) > 100
+
+def test_async_type_check_errors():
+    data = items(1000)
+    data[500]["price"] = "1"
+    async def main(**kwargs):
+        try:
+            await async_type_check(Items, data, **kwargs)
+            assert False
+        except errors.ValidationError as ve:
+            assert ve.path == [500, "price"]
+    asyncio.run(main(batch_size = 10))
+    with ThreadPoolExecutor(1) as executor:
+        asyncio.run(main(executor_threshold = 100, executor = executor))
@@ -0,0 +1,40 @@
+
+from typecube.annotations import *
+
+def test_annotation_lookup():
+    annotations = Annotations([Annotation("a", 1), Annotation("b"), Annotation("a", 2)])
+    assert [a.name for a in annotations] == ["a", "b", "a"]
+    assert len(annotations) == 3
+    assert annotations.has("a") and not annotations.has("c")
+    assert annotations.get_first("a").value == 1
+    assert annotations.get_first("c") is None
+    assert [a.value for a in annotations.get_all("a")] == [1, 2]
+    assert annotations.get_all("c") == []
+    annotations.all_annotations.append(Annotation("d"))
+    assert len(annotations) == 3 and not annotations.has("d")
+
+    annotations.add(Annotation("c"))
+    assert annotations.has("c")
+    assert [a.name for a in Annotations(annotations)] == ["a", "b", "a", "c"]
+
+def test_annotation_params():
+    annotation = Annotation("range", param_specs = {"min": [1, 2], "max": 10})
+    assert annotation.has_params and not Annotation("x").has_params
+    assert annotation.has_param("min") and not annotation.has_param("other")
+    assert annotation.first_value_of("min") == 1
+    assert annotation.first_value_of("max") == 10
+    assert annotation.first_value_of("other", 5) == 5
+    assert annotation.value == {"min": [1, 2], "max": 10}
+    assert not hasattr(annotation, "__dict__")
+
+def test_annotatable():
+    annotatable = Annotatable(Annotations([Annotation("deprecated")]), "Some docs")
+    assert annotatable.has_annotation("deprecated")
+    assert annotatable.get_annotation("deprecated").name == "deprecated"
+    assert annotatable.get_annotation("other") is None
+
+    copy = Annotatable()
+    copy.copy_from(annotatable)
+    copy.annotations.add(Annotation("other"))
+    assert copy.has_annotation("deprecated") and copy.has_annotation("other")
+    assert not annotatable.has_annotation("other")
@@ -0,0 +1,114 @@
+import mmap
+import struct
+import tempfile
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube.codec import Codec
+
+Pair = RecordType("Pair", ["F", "S"])       \
+                .add(TypeVar("F"), "first") \
+                .add(TypeVar("S"), "second")
+Point = TupleType("Point").add(defaults.Double).add(defaults.Double)
+Shape = UnionType("Shape")                                          \
+                .add(Point, "point")                                \
+                .add(defaults.Array[Point], "polygon")
+Sample = RecordType("Sample")                                       \
+                .add(defaults.Int, "id")                            \
+                .add(defaults.Long, "timestamp")                    \
+                .add(defaults.Byte, "flags")                        \
+                .add(defaults.String, "name")                       \
+                .add(defaults.Array[defaults.Float], "readings")    \
+                .add(defaults.Map[defaults.String, defaults.Int], "counts") \
+                .add(Pair[Point, Shape], "shapes")
+
+def sample():
+    return {"id": 7, "timestamp": 2**40, "flags": 3, "name": "café",
+            "readings": [1.5, 2.5, -3.0], "counts": {"a": 1, "b": 2},
+            "shapes": {"first": (1.0, 2.0), "second": {"polygon": [(0.0, 0.0), (1.0, 1.0)]}}}
+
+def test_round_trip():
+    codec = Codec(Sample)
+    encoded = codec.encode(sample())
+    # Leading fixed width fields are packed together
+    assert struct.unpack_from("<iqB", encoded) == (7, 2**40, 3)
+    decoded = codec.decode(encoded)
+    assert isinstance(decoded["readings"], memoryview)
+    assert decoded["readings"].tolist() == [1.5, 2.5, -3.0]
+    decoded["readings"] = decoded["readings"].tolist()
+    assert decoded == sample()
+
+def test_zero_copy_decoding():
+    codec = Codec(defaults.Array[defaults.Int])
+    encoded = codec.encode(list(range(1000)))
+    with tempfile.TemporaryFile() as outfile:
+        outfile.write(encoded)
+        outfile.flush()
+        mapped = mmap.mmap(outfile.fileno(), 0, access = mmap.ACCESS_READ)
+        values = codec.decode(mapped)
+        assert values[999] == 999 and len(values) == 1000
+        values.release()
+        mapped.close()
+
+def test_errors():
+    codec = Codec(Sample)
+    value = sample()
+    value["shapes"]["second"]["polygon"][1] = (1.0, "x")
+    try:
+        codec.encode(value)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.location == "shapes.second.polygon[1][1]"
+
+    encoded = codec.encode(sample())
+    try:
+        codec.decode(encoded[:-3])
+        assert False
+    except errors.DecodeError as de: pass
+    try:
+        codec.decode(encoded + b"\0")
+        assert False
+    except errors.DecodeError as de:
+        assert de.offset == len(encoded)
+
+def test_exact_types():
+    codec = Codec(Sample)
+    for field,value,path in [("id", True, ["id"]), ("timestamp", 1.0, ["timestamp"]),
+                             ("readings", [1.0, 2], ["readings", 1])]:
+        data = sample()
+        data[field] = value
+        try:
+            codec.encode(data)
+            assert False
+        except errors.ValidationError as ve:
+            assert ve.path == path
+    try:
+        Codec(defaults.Float).encode(1)
+        assert False
+    except errors.ValidationError as ve: pass
+
+    # Containers must be of the exact python type
+    for field,value in [("counts", [1, 2]), ("readings", 3), ("readings", {1.0: 1}),
+                        ("shapes", ["first", "second"]), ("shapes", "first")]:
+        data = sample()
+        data[field] = value
+        try:
+            codec.encode(data)
+            assert False
+        except errors.ValidationError as ve:
+            assert ve.path == [field]
+    try:
+        Codec(defaults.Array[defaults.String]).encode({"a": 1})
+        assert False
+    except errors.ValidationError as ve: pass
+
+    # Floats are not rounded
+    assert Codec(defaults.Float).decode(Codec(defaults.Float).encode(0.1)) == 0.1
+
+    codec = Codec(defaults.String)
+    encoded = codec.encode("ab")
+    try:
+        codec.decode(encoded[:5] + b"\xff")
+        assert False
+    except errors.DecodeError as de:
+        assert de.offset == 5
@@ -0,0 +1,37 @@
+import pytest
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+
+numpy = pytest.importorskip("numpy")
+from typecube.columnar import ColumnarArray, record_dtype
+
+Sample = RecordType("Sample")                   \
+            .add(defaults.Long, "timestamp")    \
+            .add(defaults.Int, "sensor")        \
+            .add(defaults.Double, "value")      \
+            .add(defaults.Byte, "flags")
+
+def test_columnar_round_trip():
+    assert record_dtype(defaults.Array[Sample]).names == ("timestamp", "sensor", "value", "flags")
+    records = [{"timestamp": 2**40 + i, "sensor": i, "value": i / 2.0, "flags": i % 256} for i in range(1000)]
+    columns = ColumnarArray.from_records(defaults.Array[Sample], records)
+    assert len(columns) == 1000 and columns["sensor"][10] == 10
+    assert columns[3] == records[3]
+    assert columns.to_records() == records
+    assert columns.array.nbytes == 1000 * 21
+
+def test_columnar_validation():
+    try:
+        ColumnarArray.from_records(Sample, [{"timestamp": 1, "sensor": "1", "value": 1.0, "flags": 0}])
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == [0, "sensor"]
+    try:
+        ColumnarArray(Sample, numpy.zeros(3, dtype = [("timestamp", "<q")]))
+        assert False
+    except errors.ValidationError as ve: pass
+    try:
+        record_dtype(RecordType("Named").add(defaults.String, "name"))
+        assert False
+    except errors.TCException as ve: pass
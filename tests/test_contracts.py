@@ -0,0 +1,62 @@
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube.contracts import contract
+
+Scale = FunctionType("scale")                   \
+            .add(defaults.Array[defaults.Int], "values")    \
+            .add(defaults.Int, "factor")                    \
+            .set_output(defaults.Array[defaults.Int])
+
+def test_contract():
+    @contract(Scale)
+    def scale(values, factor = 2):
+        return [v * factor for v in values]
+    assert scale([1, 2]) == [2, 4]
+    assert scale(values = [1], factor = 3) == [3]
+    try:
+        scale([1, "2"])
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["values", 1]
+    try:
+        scale([1], 0.5)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["factor"]
+
+    @contract(Scale)
+    def bad_scale(values, factor):
+        return [v / factor for v in values]
+    try:
+        bad_scale([2], 2)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["return", 0]
+    assert scale.contract_stats.calls == 4 and scale.contract_stats.failures == 2
+    assert scale.contract_stats.checked == 4 and bad_scale.contract_stats.failures == 1
+
+    # Errors of the function itself are not failures of the contract
+    @contract(Scale)
+    def failing(values, factor):
+        raise errors.ValidationError("Not a contract failure")
+    try:
+        failing([1], 1)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == []
+    assert failing.contract_stats.checked == 1 and failing.contract_stats.failures == 0
+
+def test_sampled_contract():
+    @contract(Scale, sample_every = 10)
+    def scale(values, factor):
+        return values
+    for i in range(100):
+        scale(["x"] if i % 10 else [1], 1)
+    assert scale.contract_stats.checked == 10 and scale.contract_stats.skipped == 90
+
+    @contract(Scale, budget = 0)
+    def unchecked(values, factor):
+        return values
+    unchecked(["x"], 1)
+    assert unchecked.contract_stats.checked == 0
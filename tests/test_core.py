@@ -72,4 +72,492 @@ def test_record_to_object():
     serialize it to some representation, deserialize some representation to
     an instance of the type.
     """
-    pass
+    from typecube.classes import make_class
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    Point = TupleType("Point").add(defaults.Float).add(defaults.Float)
+    Line = RecordType("Line")                                   \
+                .add(Pair[Point, Point], "ends")                \
+                .add(defaults.Array[defaults.String], "labels")
+
+    LineClass = make_class(Line)
+    assert make_class(Line) is LineClass and LineClass.__name__ == "Line"
+    data = {"ends": {"first": (0.0, 1.0), "second": (2.0, 3.0)}, "labels": ["a"]}
+    line = LineClass.from_dict(data)
+    assert not hasattr(line, "__dict__")
+    assert line.ends.second._1 == 3.0 and tuple(line.ends.first) == (0.0, 1.0)
+    assert line.to_dict() == data
+    assert LineClass.from_dict(line.to_dict()) == line
+
+    # Applications get the classes of their concrete types
+    PairClass = make_class(Pair[Point, Point])
+    assert PairClass is line.ends.__class__ and PairClass.__name__ == "Pair"
+    assert PairClass.from_dict(data["ends"]) == line.ends
+
+    # Classes of applications stay the same even if the applications are
+    # dropped in between, and classes do not keep their types alive
+    import gc
+    import weakref
+    IntPair = make_class(Pair[defaults.Int, defaults.Int])
+    gc.collect()
+    assert make_class(Pair[defaults.Int, defaults.Int]) is IntPair
+    Temp = RecordType("Temp").add(defaults.Int, "x")
+    temp = weakref.ref(Temp)
+    make_class(Temp)
+    del Temp
+    gc.collect()
+    assert temp() is None
+
+    # Classes that validate
+    PointClass = make_class(Point, validate = True)
+    assert PointClass(1.0, 2.0).to_tuple() == (1.0, 2.0)
+    try:
+        PointClass(1.0, "2")
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == [1]
+    try:
+        make_class(Line, validate = True).from_dict({"ends": {"first": (0.0, 1.0), "second": (2.0, 3)}, "labels": []})
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.location == "ends.second[1]"
+    try:
+        make_class(Pair)
+        assert False
+    except errors.TCException as ve: pass
+
+def test_compiled_validation():
+    check_int = checkers.compile(defaults.Int)
+    check_int(50)
+    try:
+        check_int(50.5)
+        assert False
+    except errors.ValidationError as ve: pass
+
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    check_pair = checkers.compile(Pair[defaults.Int, defaults.Array[defaults.String]])
+    check_pair({'first': 1, 'second': ['a', 'b']})
+    for bad in [{'first': 1.0, 'second': []}, {'first': 1, 'second': [1]}, {'first': 1}]:
+        try:
+            check_pair(bad)
+            assert False
+        except errors.ValidationError as ve: pass
+
+def test_compiled_nested_generics():
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    # Map<String, List<Pair<Int, S>>> with S bound by the caller
+    thetype = defaults.Map[defaults.String, defaults.List[Pair[defaults.Int, TypeVar("S")]]]
+    check = checkers.compile(thetype, {"S": defaults.Float})
+    check({"a": [{"first": 1, "second": 2.0}], "b": []})
+    try:
+        check({"a": [{"first": 1, "second": 2}]})
+        assert False
+    except errors.ValidationError as ve: pass
+
+def test_compiled_with_unbound_type():
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    check = checkers.compile(Pair)
+    try:
+        check({'first': 1, 'second': '2'})
+        assert False
+    except errors.ValidationError as ve: pass
+
+def test_type_check_many():
+    checkers.type_check_many(defaults.Int, [1, 2, 3])
+    checkers.type_check_many(defaults.Array[defaults.Float], iter([[1.0], [], [2.5, 3.5]]))
+    try:
+        checkers.type_check_many(defaults.Int, [1, 2, 3.0])
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == [2]
+
+def test_bulk_array_checking():
+    values = list(range(1000))
+    for check in [checkers.compile(defaults.Array[defaults.Int]),
+                  lambda data: checkers.type_check(defaults.Array[defaults.Int], data)]:
+        check(values)
+        check([])
+        for bad in [values + [1.0], values + [True]]:
+            try:
+                check(bad)
+                assert False
+            except errors.ValidationError as ve:
+                assert ve.path == [1000]
+
+    check = checkers.compile(defaults.Map[defaults.String, defaults.Int])
+    check(dict((str(i), i) for i in range(1000)))
+    for bad in [{"a": 1, 2: 2}, {"a": 1, "b": 2.0}]:
+        try:
+            check(bad)
+            assert False
+        except errors.ValidationError as ve: pass
+
+def test_typeapp_interning():
+    assert defaults.Array[defaults.Int] is defaults.Array[defaults.Int]
+    assert defaults.Array[defaults.Int] is not defaults.Array[defaults.String]
+    assert defaults.Map[defaults.String, defaults.Int] is defaults.Map.apply(V = defaults.Int, K = defaults.String)
+
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    partial = Pair[defaults.Int]
+    assert partial.args == ("S",)
+    assert partial[defaults.String] is Pair[defaults.Int, defaults.String]
+    # Already bound values are not rebound
+    assert partial.apply(F = defaults.Float, S = defaults.String) is Pair[defaults.Int, defaults.String]
+    assert len(set([Pair[defaults.Int, defaults.String] for i in range(10)])) == 1
+    try:
+        partial.param_values["S"] = defaults.String
+        assert False
+    except TypeError: pass
+
+def test_typeapp_pickling():
+    import pickle
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(defaults.Array[TypeVar("S")], "second")
+    IntPairs = RecordType("IntPairs").add(Pair[defaults.Int, defaults.Int], "pair")
+    copy = pickle.loads(pickle.dumps(IntPairs))
+    pair_app = copy.child_types[0]
+    assert pair_app.root_type is not Pair
+    assert pair_app is pair_app.root_type.apply(**pair_app.param_values)
+
+def test_typeapp_concrete():
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(defaults.Array[TypeVar("S")], "second")
+    app = Pair[defaults.Int, defaults.String]
+    concrete = app.concrete
+    assert concrete is app.concrete
+    assert concrete.args == []
+    assert concrete.child_types[0] is defaults.Int
+    assert concrete.child_types[1] is defaults.Array[defaults.String]
+    # The generic type itself is left untouched
+    assert Pair.args == ["F", "S"]
+    assert isinstance(Pair.child_types[0], TypeVar)
+    assert defaults.Array[defaults.Int].concrete is defaults.Array[defaults.Int]
+
+    # Recursive generic types refer to their own (interned) application
+    Node = RecordType("Node", ["T"])
+    Node.add(TypeVar("T"), "value").add(defaults.Array[Node[TypeVar("T")]], "children")
+    concrete = Node[defaults.Int].concrete
+    assert concrete.child_types[1] is defaults.Array[Node[defaults.Int]]
+    tree = {"value": 1, "children": [{"value": 2, "children": []}]}
+    checkers.type_check(Node[defaults.Int], tree)
+    checkers.compile(Node[defaults.Int])
+
+    # Concrete types are expanded again once the root type gains children
+    Box = RecordType("Box", ["T"]).add(TypeVar("T"), "value")
+    app = Box[defaults.Int]
+    assert app.concrete.child_names == ["value"]
+    Box.add(TypeVar("T"), "other")
+    assert app.concrete.child_names == ["value", "other"]
+    assert app.concrete.child_types[1] is defaults.Int
+    try:
+        checkers.type_check(Node[defaults.Int], {"value": 1, "children": [{"value": 2.0, "children": []}]})
+        assert False
+    except errors.ValidationError as ve: pass
+
+def test_nested_generics():
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    thetype = defaults.Map[defaults.String, defaults.List[Pair[defaults.Int, defaults.Float]]]
+    checkers.type_check(thetype, {"a": [{"first": 1, "second": 2.0}], "b": []})
+    try:
+        checkers.type_check(thetype, {"a": [{"first": 1, "second": 2}]})
+        assert False
+    except errors.ValidationError as ve: pass
+
+def test_bindings_scopes():
+    bindings = checkers.Bindings()
+    bindings["T"] = defaults.Int
+    bindings.push()
+    bindings["T"] = defaults.String
+    assert bindings["T"] is defaults.String
+    try:
+        bindings["T"] = defaults.Float
+        assert False
+    except errors.ValidationError as ve: pass
+    bindings.pop()
+    assert bindings["T"] is defaults.Int
+    assert bindings.level == 0
+
+def test_error_paths():
+    Item = RecordType("Item").add(defaults.Float, "price")
+    Order = RecordType("Order")                                 \
+                .add(defaults.Array[Item], "items")             \
+                .add(defaults.Map[defaults.String, defaults.Int], "counts")
+    Orders = RecordType("Orders").add(defaults.Array[Order], "orders")
+    def order(price = 1.0, counts = None):
+        return {"items": [{"price": 1.0}, {"price": price}], "counts": counts or {"a": 1}}
+    good = {"orders": [order() for i in range(20)]}
+    bad = {"orders": [order() for i in range(20)]}
+    bad["orders"][3] = order(price = 1)
+    bad["orders"][17] = order(price = "1", counts = {"a": 1, "b c": 2.0})
+    del bad["orders"][18]["counts"]
+
+    for check in [lambda data, fail_fast = True: checkers.type_check(Orders, data, fail_fast = fail_fast),
+                  lambda data, fail_fast = True: checkers.compile(Orders, fail_fast = fail_fast)(data)]:
+        check(good)
+        check(good, False)
+        try:
+            check(bad)
+            assert False
+        except errors.ValidationError as ve:
+            assert not isinstance(ve, errors.ValidationErrors)
+            assert ve.path == ["orders", 3, "items", 1, "price"]
+            assert str(ve).startswith("orders[3].items[1].price: ")
+        try:
+            check(bad, False)
+            assert False
+        except errors.ValidationErrors as ve:
+            assert [e.location for e in ve.errors] == ["orders[3].items[1].price",
+                                                       "orders[17].items[1].price",
+                                                       "orders[17].counts['b c']",
+                                                       "orders[18].counts"]
+
+def test_collect_all_single_error():
+    for check in [lambda thetype, data: checkers.type_check(thetype, data, fail_fast = False),
+                  lambda thetype, data: checkers.type_check(thetype, data, fail_fast = False, memoize = True),
+                  lambda thetype, data: checkers.compile(thetype, fail_fast = False)(data)]:
+        try:
+            check(defaults.Int, "1")
+            assert False
+        except errors.ValidationErrors as ve:
+            assert len(ve.errors) == 1 and ve.errors[0].path == []
+
+def test_collect_all_many():
+    try:
+        checkers.type_check_many(defaults.Array[defaults.Int], [[1], [1, 2.0, 3.0], [], ["a"]], fail_fast = False)
+        assert False
+    except errors.ValidationErrors as ve:
+        assert [e.path for e in ve.errors] == [[1, 1], [1, 2], [3, 0]]
+
+def test_tuple_errors_without_asserts():
+    MyTuple = TupleType("MyTuple").add(defaults.Int).add(defaults.String)
+    for bad in [[1, "a"], (1,), (1, 2)]:
+        try:
+            checkers.type_check(MyTuple, bad)
+            assert False
+        except errors.ValidationError as ve: pass
+
+def test_tagged_unions():
+    Event = UnionType("Event")
+    for index in range(50):
+        Event.add(RecordType("Event%d" % index).add(defaults.Int, "id"), "event%d" % index)
+    assert Event.child_indexes["event42"] == 42
+    for check in [lambda data: checkers.type_check(Event, data), checkers.compile(Event)]:
+        check({"event42": {"id": 1}})
+        try:
+            check({"event42": {"id": "1"}})
+            assert False
+        except errors.ValidationError as ve:
+            assert ve.location == "event42.id"
+        try:
+            check({"event42": {"id": 1}, "event43": {"id": 1}})
+            assert False
+        except errors.ValidationError as ve: pass
+
+def test_untagged_unions():
+    Circle = RecordType("Circle").add(defaults.Float, "radius")
+    Square = RecordType("Square").add(defaults.Float, "side")
+    Value = UnionType("Value")                                  \
+                .add(defaults.Int, "int")                       \
+                .add(defaults.String, "string")                 \
+                .add(defaults.Array[defaults.Int], "ints")      \
+                .add(Circle, "circle")                          \
+                .add(Square, "square")
+    index = checkers._union_index(Value)
+    assert index.candidates(1) == [0]
+    assert index.candidates([1]) == [2]
+    assert index.candidates({"side": 1.0}) == [4]
+    for check in [lambda data: checkers.type_check(Value, data), checkers.compile(Value)]:
+        for data in [1, "a", [1, 2], {"radius": 1.0}, {"side": 2.0}, {"string": "a"}]:
+            check(data)
+        for data in [1.0, ["a"], {"side": 1}, {"other": 1.0}]:
+            try:
+                check(data)
+                assert False
+            except errors.ValidationError as ve: pass
+        try:
+            check({"side": "1"})
+            assert False
+        except errors.ValidationError as ve:
+            assert ve.path == ["side"]
+
+def test_memoized_validation():
+    # Tree<T> { value : T, children : Array<Tree<T>> }
+    Tree = RecordType("Tree", ["T"]).add(TypeVar("T"), "value")
+    Tree.add(defaults.Array[Tree[TypeVar("T")]], "children")
+    visits = []
+    counted = RecordType("Counted").add(defaults.Int, "x").set_validator(lambda t, v, b: visits.append(v))
+    thetype = Tree[counted]
+
+    shared = {"x": 1}
+    root = node = {"value": shared, "children": []}
+    for i in range(5000):
+        child = {"value": shared, "children": []}
+        node["children"].append(child)
+        node = child
+    checkers.type_check(thetype, root, memoize = True)
+    assert len(visits) == 1
+
+    node["value"] = {"x": "1"}
+    try:
+        checkers.type_check(thetype, root, memoize = True)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path[-3:] == [0, "value", "x"] and len(ve.path) == 5000 * 2 + 2
+
+    # Cycles
+    node["value"] = shared
+    node["children"].append(root)
+    try:
+        checkers.type_check(thetype, root, memoize = True)
+        assert False
+    except errors.ValidationError as ve:
+        assert "Cycle" in ve.msg
+    checkers.type_check(thetype, root, memoize = True, allow_cycles = True)
+
+def test_memoized_collect_all():
+    Pair = RecordType("Pair").add(defaults.Int, "first").add(defaults.Array[defaults.String], "second")
+    data = [{"first": "1", "second": ["a"]}, {"first": 2, "second": [3]}]
+    try:
+        checkers.type_check(defaults.Array[Pair], data, fail_fast = False, memoize = True)
+        assert False
+    except errors.ValidationErrors as ve:
+        assert [e.path for e in ve.errors] == [[0, "first"], [1, "second", 0]]
+
+def test_validation_cache():
+    checked = []
+    Point = RecordType("Point").add(defaults.Int, "x").add(defaults.Int, "y")
+    Point.set_validator(lambda thetype, value, bindings: checked.append(value))
+    cache = checkers.ValidationCache(maxsize = 2)
+    cache.type_check(Point, {"x": 1, "y": 2})
+    cache.type_check(Point, {"x": 1, "y": 2})
+    assert len(checked) == 1 and cache.hits == 1 and cache.misses == 1
+    try:
+        cache.type_check(Point, {"x": True, "y": 2})
+        assert False
+    except errors.ValidationError as ve: pass
+    cache.type_check(Point, {"x": 2, "y": 2})
+    cache.type_check(Point, {"x": 3, "y": 2})
+    assert cache.stats["evictions"] == 1 and len(cache) == 2
+
+    # Values are validated again once validators change
+    Point.set_validator(lambda thetype, value, bindings: checked.append(value))
+    cache.type_check(Point, {"x": 3, "y": 2})
+    assert cache.misses == 5 and len(checked) == 4
+    cache.invalidate(Point)
+    assert len(cache) == 0
+
+    # And once types change
+    cache.type_check(Point, {"x": 3, "y": 2})
+    Point.add(defaults.Int, "z")
+    try:
+        cache.type_check(Point, {"x": 3, "y": 2})
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["z"]
+
+def test_freeze():
+    import pickle
+    Pair = RecordType("Pair", ["F", "S"])       \
+                    .add(TypeVar("F"), "first") \
+                    .add(TypeVar("S"), "second")
+    Tree = RecordType("Tree").add(defaults.Int, "value")
+    Tree.add(defaults.Array[Tree], "children")
+    Both = RecordType("Both").add(Pair[defaults.Int, defaults.String], "pair").add(Tree, "tree")
+    frozen = freeze(Both)
+    assert isinstance(frozen, RecordType) and isinstance(frozen, Frozen)
+    assert not hasattr(frozen, "__dict__") and frozen.child_types[0] is not Both.child_types[0]
+    assert frozen.child_names == ("pair", "tree") and frozen.child_indexes["tree"] == 1
+    tree = frozen.child_types[1]
+    assert tree.child_types[1].param_values["T"] is tree
+    assert tree.child_types[0] is defaults.Int
+
+    data = {"pair": {"first": 1, "second": "2"}, "tree": {"value": 1, "children": [{"value": 2, "children": []}]}}
+    checkers.type_check(frozen, data)
+    checkers.compile(frozen)(data)
+    assert frozen.child_types[0].concrete.child_types == (defaults.Int, defaults.String)
+    checkers.type_check(pickle.loads(pickle.dumps(frozen)), data)
+
+    for change in [lambda: frozen.add(defaults.Int, "x"), lambda: frozen.set_name("x"),
+                   lambda: frozen.set_validator(None)]:
+        try:
+            change()
+            assert False
+        except AttributeError: pass
+
+def test_structural_relations():
+    Point = RecordType("Point").add(defaults.Int, "x").add(defaults.Int, "y")
+    Point2 = RecordType("Point2").add(defaults.Int, "x").add(defaults.Int, "y")
+    Point3 = RecordType("Point3").add(defaults.Int, "x").add(defaults.Int, "y").add(defaults.Int, "z")
+    assert structurally_equal(Point, Point2) and structural_hash(Point) == structural_hash(Point2)
+    assert not structurally_equal(Point, Point3)
+    assert is_subtype(Point3, Point) and not is_subtype(Point, Point3)
+    assert is_subtype(defaults.Array[Point3], defaults.Array[Point])
+    assert not is_subtype(defaults.Array[Point3], defaults.List[Point])
+
+    # Natives are nominal but assignable through their validators
+    LongPoint = RecordType("LongPoint").add(defaults.Long, "x").add(defaults.Long, "y")
+    assert not is_subtype(Point, LongPoint) and is_assignable(Point, LongPoint)
+    assert not is_assignable(Point, RecordType("P").add(defaults.String, "x"))
+
+    # Recursive types are compared coinductively
+    A = RecordType("A").add(defaults.Int, "value")
+    A.add(defaults.Array[A], "children")
+    B = RecordType("B").add(defaults.Int, "value")
+    B.add(defaults.Array[B], "children")
+    assert structurally_equal(A, B) and structural_hash(A) == structural_hash(B)
+    assert is_subtype(A, B)
+
+    # Unions are related through their branches, whatever their names
+    Shape = UnionType("Shape").add(Point, "point").add(defaults.String, "label")
+    Points = UnionType("Points").add(Point3, "p3")
+    assert is_subtype(Points, Shape) and not is_subtype(Shape, Points)
+    Scalars = UnionType("Scalars").add(defaults.Int).add(defaults.String)
+    More = UnionType("More").add(defaults.Int).add(defaults.String).add(defaults.Double)
+    assert is_subtype(Scalars, More) and not is_subtype(More, Scalars)
+    assert is_subtype(defaults.Int, Scalars) and is_subtype(Point3, Shape)
+    assert not is_subtype(defaults.Double, Scalars) and not is_subtype(Scalars, defaults.Int)
+    assert is_assignable(defaults.Int, UnionType("Longs").add(defaults.Long))
+    assert not structurally_equal(Scalars, More)
+
+    Pair = RecordType("Pair", ["F", "S"]).add(TypeVar("F"), "first").add(TypeVar("S"), "second")
+    assert structurally_equal(Pair[defaults.Int, defaults.Int], RecordType("P").add(defaults.Int, "first").add(defaults.Int, "second"))
+
+    # Results are dropped when types change
+    assert is_subtype(Point2, Point)
+    Point.add(defaults.Int, "w")
+    assert not is_subtype(Point2, Point) and not structurally_equal(Point, Point2)
+
+def test_typeapp_released():
+    import gc
+    import weakref
+    Box = RecordType("Box", ["T"]).add(TypeVar("T"), "value")
+    apps = [weakref.ref(Box[RecordType("R%d" % i)]) for i in range(10)]
+    gc.collect()
+    assert all(app() is None for app in apps)
+    kept = Box[defaults.Int]
+    gc.collect()
+    assert Box[defaults.Int] is kept
+
+def test_type_check_steps():
+    Ints = defaults.Array[defaults.Int]
+    Pair = TupleType("Pair").add(defaults.Int).add(defaults.Int)
+    # There is at least a step for each of the 7 values
+    assert len(list(checkers.type_check_steps(defaults.Array[Pair], [(1, 2), (3, 4)]))) >= 7
+    try:
+        for _ in checkers.type_check_steps(Ints, [1, "2"], fail_fast = False): pass
+        assert False
+    except errors.ValidationErrors as ve:
+        assert [e.path for e in ve.errors] == [[1]]
@@ -0,0 +1,86 @@
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube.incremental import revalidate, parse_pointer, Tracker
+
+def positive(thetype, value, bindings = None):
+    if value["port"] <= 0:
+        raise errors.ValidationError("Port must be positive")
+
+Server = RecordType("Server").add(defaults.String, "host").add(defaults.Int, "port").set_validator(positive)
+Config = RecordType("Config")                                                   \
+                .add(defaults.Map[defaults.String, Server], "servers")          \
+                .add(defaults.Array[defaults.String], "tags")
+
+def config():
+    return {"servers": {"a": {"host": "x", "port": 80}}, "tags": ["t"]}
+
+def failure(*args):
+    try:
+        revalidate(*args)
+    except errors.ValidationError as ve:
+        return ve
+    assert False, "Expected a validation error"
+
+def test_revalidate_paths():
+    value = config()
+    value["servers"]["b"] = {"host": "y", "port": 81}
+    value["tags"].append("u")
+    revalidate(Config, value, [["servers", "b"], ["tags", 1]])
+
+    value["servers"]["a"]["port"] = "80"
+    assert failure(Config, value, [["servers", "a", "port"]]).location == "servers.a.port"
+    value["servers"]["a"]["port"] = -1
+    # Validators of enclosing types are run again
+    assert failure(Config, value, [["servers", "a", "port"]]).location == "servers.a"
+
+def test_revalidate_patch():
+    assert parse_pointer("/a/b~1c/0") == ["a", "b/c", "0"]
+    value = config()
+    value["tags"].pop()
+    del value["servers"]["a"]
+    revalidate(Config, value, [{"op": "remove", "path": "/tags/0"},
+                               {"op": "remove", "path": "/servers/a"}])
+    del value["tags"]
+    assert failure(Config, value, [{"op": "remove", "path": "/tags"}]).path == ["tags"]
+    value["tags"] = [1]
+    assert failure(Config, value, [{"op": "add", "path": "/tags"}]).path == ["tags", 0]
+
+def test_tracker():
+    value = config()
+    tracker = Tracker(value)
+    tracker.value["servers"]["a"]["host"] = "z"
+    tracker.value["tags"].insert(0, "s")
+    assert tracker.changes == [{"op": "replace", "path": ["servers", "a", "host"]},
+                               {"op": "replace", "path": ["tags"]}]
+    tracker.revalidate(Config)
+    assert tracker.changes == [] and value["tags"] == ["s", "t"]
+
+    tracker.value["servers"].setdefault("b", {"host": "y"})
+    try:
+        tracker.revalidate(Config)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.location == "servers.b.port"
+
+def test_tracker_shifted_lists():
+    value = config()
+    value["tags"] = ["a", "b"]
+    tracker = Tracker(value)
+    tracker.value["tags"][1] = 5
+    tracker.value["tags"].insert(0, "x")
+    # The element changed at 1 is now at 2
+    try:
+        tracker.revalidate(Config)
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["tags", 2]
+
+    value["tags"] = ["a", "b", "c"]
+    tracker.clear()
+    tracker.value["tags"].append("d")
+    tracker.value["tags"].pop()
+    assert tracker.changes == [{"op": "replace", "path": ["tags", 3]}, {"op": "remove", "path": ["tags", 3]}]
+    tracker.value["tags"].pop(0)
+    assert tracker.changes[-1] == {"op": "replace", "path": ["tags"]}
+    tracker.revalidate(Config)
@@ -0,0 +1,122 @@
+
+import os
+from typecube.core import *
+from typecube import defaults
+from typecube import checkers
+from typecube import errors
+from typecube import loader
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "samples")
+
+SOURCE = """
+/* Some types */
+namespace test.types {
+    atomic int
+    atomic string;
+    atomic Array<T>
+
+    record <F, S> Pair {
+        first : F
+        second : S
+    }
+
+    // Refers to a type declared later
+    record Person : Named {
+        age : int;
+        friends : Array<Named>
+        scores : Pair<int, (string, int)>
+    }
+
+    record Named { name : string }
+}
+"""
+
+def test_load_string():
+    root = loader.load_string(SOURCE)
+    namespace = root.ensure("test.types")
+    assert namespace.fqn == "test.types"
+    Person = root.find_type("test.types.Person")
+    assert Person.child_names == ["name", "age", "friends", "scores"]
+    Named = namespace.types["Named"]
+    assert Person.child_types[0] is namespace.types["string"]
+    assert Person.child_types[2] is namespace.types["Array"][Named]
+    scores = Person.child_types[3]
+    assert scores.root_type is namespace.types["Pair"]
+    assert isinstance(scores.param_values["S"], TupleType)
+    assert isinstance(namespace.types["Pair"].child_types[0], TypeVar)
+
+def test_builtins():
+    root = loader.load_string(SOURCE)
+    namespace = root.ensure("test.types")
+    assert namespace.types["int"] is defaults.Int and namespace.types["Array"] is defaults.Array
+    Person = namespace.types["Person"]
+    checkers.type_check(Person, {"name": "x", "age": 1, "friends": [{"name": "y"}], "scores": {"first": 1, "second": ("a", 2)}})
+    try:
+        checkers.type_check(Person, {"name": "x", "age": "1", "friends": [], "scores": {"first": 1, "second": ("a", 2)}})
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["age"]
+
+    root = loader.load_string(SOURCE, builtins = {})
+    assert root.find_type("test.types.int") is not defaults.Int
+
+def test_annotations_and_defaults():
+    root = loader.load_string("""
+    namespace a {
+        atomic int
+        atomic string
+        @allowed_annotations(null : boolean, choices : Array<(string, string)>?, index : boolean = false)
+        atomic Field
+        @doc("A field") @deprecated
+        record CharField {
+            @min(1) max_length : int = 50
+            help_text : string = "(\\"help\\")";
+            choices : (string, string)?
+            ratio : int = -1.5
+        }
+    }
+    """)
+    CharField = root.find_type("a.CharField")
+    assert CharField.child_names == ["max_length", "help_text", "choices", "ratio"]
+    assert isinstance(CharField.child_types[2], TupleType)
+
+def test_load_errors():
+    for source in ["namespace a { record A { x : Unknown } }",
+                   "namespace a { atomic A atomic B<T> record A { } }",
+                   "namespace a { record A { x : B<int> } atomic B atomic int }",
+                   "namespace a { record A : A { } }",
+                   "namespace a { atomic int record A { x : int x : int } }",
+                   "namespace a { atomic int",
+                   "namespace a { atomic int record A { x : int = } }",
+                   "namespace a { @foo(x atomic int }"]:
+        try:
+            loader.load_string(source)
+            assert False, source
+        except errors.ParseError as pe: pass
+
+def test_load_samples():
+    for sample in ["gae", "pegasus", "thrift", "protobuf", "espresso"]:
+        loader.load_file(os.path.join(SAMPLES_DIR, sample, "types.tc"))
+
+def test_load_cached(tmpdir):
+    path = os.path.join(SAMPLES_DIR, "gae", "types.tc")
+    cache_dir = str(tmpdir.join("cache"))
+    first = loader.load_file(path, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    second = loader.load_file(path, cache_dir)
+    assert first is not second
+    blob = second.find_type("onering.gae.types.Blob")
+    Array = second.find_type("onering.gae.types.Array")
+    Byte = second.find_type("onering.gae.types.Byte")
+    assert blob.child_types[0] is Array[Byte]
+    # Builtins are not copied into caches
+    assert Array is defaults.Array and Byte is defaults.Byte
+
+    # Stale or corrupt caches are ignored and rewritten
+    cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    with open(cache_path, "wb") as outfile:
+        outfile.write(b"garbage")
+    third = loader.load_file(path, cache_dir)
+    assert third.find_type("onering.gae.types.Blob") is not None
+    with open(cache_path, "rb") as infile:
+        assert infile.read(len(loader.CACHE_HEADER)) == loader.CACHE_HEADER
@@ -0,0 +1,24 @@
+
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube.parallel import type_check_parallel
+
+Pair = RecordType("Pair", ["F", "S"])       \
+                .add(TypeVar("F"), "first") \
+                .add(TypeVar("S"), "second")
+
+def test_parallel_validation():
+    thetype = Pair[defaults.Int, defaults.String]
+    values = ({"first": i, "second": str(i)} for i in range(1000))
+    assert type_check_parallel(thetype, values, workers = 2, chunksize = 64) == []
+
+    values = [{"first": i, "second": str(i)} for i in range(1000)]
+    for index in [999, 5, 500]:
+        values[index] = {"first": str(index), "second": "x"}
+    failures = type_check_parallel(thetype, values, workers = 2, chunksize = 64)
+    assert [index for index,_ in failures] == [5, 500, 999]
+    assert all(isinstance(ve, errors.ValidationError) for _,ve in failures)
+
+    failures = type_check_parallel(thetype, values, workers = 2, chunksize = 64, fail_fast = True)
+    assert [index for index,_ in failures] == [5]
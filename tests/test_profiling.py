@@ -0,0 +1,64 @@
+import pytest
+from typecube.core import *
+from typecube import defaults
+from typecube import checkers
+from typecube import errors
+from typecube.profiling import Profiler
+
+Item = RecordType("Item").add(defaults.String, "name").add(defaults.Float, "price")
+Order = RecordType("Order").add(defaults.Int, "id").add(defaults.Array[Item], "items")
+
+def order(count):
+    return {"id": 1, "items": [{"name": "x", "price": 1.0} for i in range(count)]}
+
+def test_profile_type_check():
+    with Profiler() as profiler:
+        checkers.type_check(Order, order(3))
+        with pytest.raises(errors.ValidationError):
+            checkers.type_check(Order, {"id": 1, "items": [{"name": 1, "price": 1.0}]})
+    assert checkers.check_hook is None
+    assert checkers.instrument_compiled is None
+
+    stats = profiler.stats[id(Order)]
+    assert stats.name == "Order"
+    assert stats.calls == 2 and stats.failures == 1
+    # Failing elements are checked again to find the path to the error
+    assert profiler.stats[id(Item)].calls == 5
+    assert profiler.stats[id(Item)].failures == 2
+    assert profiler.stats[id(defaults.Float)].calls == 3
+    assert stats.self_time <= stats.cumulative_time
+
+    assert "Order" in profiler.table()
+    stacks = profiler.collapsed_stacks().split("\n")
+    assert any(line.startswith("Order;Array;Item;String ") for line in stacks)
+
+def test_profile_memoized():
+    with Profiler() as profiler:
+        checkers.type_check(Order, order(3), memoize = True)
+        with pytest.raises(errors.ValidationError):
+            checkers.type_check(Order, {"id": 1, "items": [{"name": 1, "price": 1.0}]}, memoize = True)
+    assert profiler.stats[id(Order)].calls == 2
+    assert profiler.stats[id(Item)].calls == 4 and profiler.stats[id(Item)].failures == 1
+    assert profiler._local.stack == []
+
+def test_profile_compiled():
+    with Profiler() as profiler:
+        check = checkers.compile(Order)
+    check(order(5))
+    assert profiler.stats[id(Order)].calls == 1
+    assert profiler.stats[id(Item)].calls == 5
+
+    # Checkers compiled after disabling are not profiled
+    checkers.compile(Order)(order(5))
+    assert profiler.stats[id(Order)].calls == 1
+
+    # Nor are cached checkers once the profiler is disabled
+    with Profiler() as profiler:
+        checkers.compiled(Order)(order(1))
+    checkers.compiled(Order)(order(1))
+    assert profiler.stats[id(Order)].calls == 1
+
+def test_single_profiler():
+    with Profiler():
+        with pytest.raises(errors.TCException):
+            Profiler().enable()
@@ -0,0 +1,68 @@
+
+import os
+from typecube.core import *
+from typecube import errors
+from typecube import loader
+from typecube.registry import Registry
+from typecube.utils import FQN
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "samples")
+
+def test_register_and_resolve():
+    registry = Registry()
+    Int = registry.register("lang.Int", NativeType("Int"))
+    Point = registry.register("geo.shapes.Point", RecordType("Point").add(Int, "x"))
+    assert registry.find("geo.shapes.Point") is Point
+    assert registry.find("geo.Point") is None
+    assert registry.namespace("geo.shapes").fqn == "geo.shapes"
+
+    assert registry.resolve("Point", "geo.shapes") is Point
+    assert registry.resolve("shapes.Point", "geo") is Point
+    assert registry.resolve("lang.Int", "geo.shapes") is Int
+    assert registry.resolve("geo.shapes.Point") is Point
+    try:
+        registry.resolve("Point", "geo")
+        assert False
+    except errors.TCException: pass
+
+    # Closer definitions shadow outer ones once registered
+    assert registry.resolve("lang.Int", "geo") is Int
+    Int2 = registry.register("geo.lang.Int", NativeType("Int"))
+    assert registry.resolve("lang.Int", "geo") is Int2
+
+def test_lazy_loading():
+    registry = Registry()
+    loaded = []
+    def load_gae(registry):
+        loaded.append(True)
+        registry.mount(loader.load_file(os.path.join(SAMPLES_DIR, "gae", "types.tc")))
+    registry.add_loader("onering.gae", load_gae)
+    registry.register("onering.other.Type", NativeType("Type"))
+    assert registry.resolve("Type", "onering.other") is not None
+    assert not loaded
+    GeoPt = registry.resolve("gae.types.GeoPt", "onering")
+    assert loaded == [True]
+    assert GeoPt.child_names == ["latitude", "longitude"]
+    assert registry.resolve("GeoPt", "onering.gae.types") is GeoPt
+    assert loaded == [True]
+
+    # Loaders that fail are run again
+    def load_flaky(registry):
+        loaded.append(False)
+        if len(loaded) == 2: raise IOError("Not yet")
+        registry.register("flaky.Type", NativeType("Type"))
+        assert registry.find("flaky.Type") is not None
+    registry.add_loader("flaky", load_flaky)
+    try:
+        registry.find("flaky.Type")
+        assert False
+    except IOError: pass
+    assert registry.find("flaky.Type") is not None
+    assert loaded == [True, False, False]
+
+def test_fqn():
+    fqn = FQN("a.b.c", None)
+    assert fqn.parts == ("c", "a.b", "a.b.c")
+    assert FQN(" c ", "a.b").fqn == "a.b.c"
+    assert FQN("c", None).parts == ("c", "", "c")
+    assert FQN(None, None).fqn is None
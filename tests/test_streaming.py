@@ -0,0 +1,61 @@
+
+import io
+import json
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube import streaming
+
+Point = RecordType("Point")                 \
+            .add(defaults.Int, "x")         \
+            .add(defaults.String, "label")
+
+def test_json_array_stream():
+    points = [{"x": i, "label": "pé%d" % i} for i in range(1000)]
+    data = json.dumps(points, ensure_ascii = False).encode("utf-8")
+    count = streaming.validate_json_stream(defaults.Array[Point], io.BytesIO(data), chunk_size = 7)
+    assert count == 1000
+    assert streaming.validate_json_stream(defaults.Array[Point], io.StringIO(" [ ] ")) == 0
+
+def test_json_array_stream_errors():
+    data = b'[{"x": 1, "label": "a"}, {"x": 2.5, "label": "b"}]'
+    try:
+        streaming.validate_json_stream(defaults.Array[Point], io.BytesIO(data), chunk_size = 3)
+        assert False
+    except errors.StreamValidationError as ve:
+        assert ve.path == [1, "x"]
+        assert ve.offset == data.index(b'{"x": 2.5')
+
+    for bad in [b'[1, 2', b'[1 2]', b'{"a": 1}', b'[1] 2']:
+        try:
+            streaming.validate_json_stream(defaults.Array[defaults.Int], io.BytesIO(bad), chunk_size = 2)
+            assert False
+        except errors.StreamValidationError as ve: pass
+
+def test_values_split_across_chunks():
+    # Every value is cut at every position by some chunk size
+    Reading = RecordType("Reading").add(defaults.Double, "value").add(defaults.String, "unit")
+    data = '[{"value": -Infinity, "unit": "\\ud834\\udd1e"}, {"value": -1.5e-10, "unit": "\\u00e9C"}]'
+    for chunk_size in range(1, 12):
+        assert streaming.validate_json_stream(defaults.Array[Reading], io.StringIO(data), chunk_size = chunk_size) == 2
+    for bad in ['[1, tx]', '[1, 2.x]', '["\\u12x4"]']:
+        try:
+            streaming.validate_json_stream(defaults.Array[defaults.Double], io.StringIO(bad), chunk_size = 1)
+            assert False
+        except errors.StreamValidationError as ve: pass
+
+def test_json_document_stream():
+    assert streaming.validate_json_stream(Point, io.StringIO('{"x": 1, "label": "a"}')) == 1
+
+def test_ndjson_stream():
+    lines = ['{"x": %d, "label": "a"}' % i for i in range(100)]
+    data = ("\n".join(lines) + "\n\n").encode("utf-8")
+    assert streaming.validate_ndjson_stream(Point, io.BytesIO(data), chunk_size = 5) == 100
+
+    data = b'{"x": 1, "label": "a"}\n{"x": "1", "label": "a"}\n'
+    try:
+        streaming.validate_ndjson_stream(Point, io.BytesIO(data))
+        assert False
+    except errors.StreamValidationError as ve:
+        assert ve.path == [1, "x"]
+        assert ve.offset == data.index(b'\n') + 1
@@ -0,0 +1,84 @@
+from typecube.core import *
+from typecube import defaults
+from typecube import errors
+from typecube.views import RecordView
+
+Customer = RecordType("Customer").add(defaults.String, "name").add(defaults.Int, "age")
+Order = RecordType("Order")                                         \
+                .add(defaults.Int, "id")                            \
+                .add(Customer, "customer")                          \
+                .add(defaults.Array[defaults.Float], "prices")
+
+def test_lazy_validation():
+    data = {"id": 1, "customer": {"name": "x", "age": "old"}, "prices": [1.0, "2"]}
+    order = RecordView(Order, data)
+    assert order.id == 1 and order["id"] == 1
+    assert order.customer.name == "x"
+    assert "prices" in order and "missing" not in order
+    try:
+        order.customer.age
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.location == "customer.age"
+    try:
+        order.prices
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["prices", 1]
+    try:
+        order.missing
+        assert False
+    except AttributeError: pass
+    try:
+        RecordView(Order, {"id": 1, "customer": []}).customer
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["customer"]
+
+def test_full_validation():
+    data = {"id": 1, "customer": {"name": "x"}, "prices": [1.0]}
+    order = RecordView(Order, data)
+    assert order.prices == [1.0]
+    try:
+        order._validate()
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.location == "customer.age"
+    data["customer"]["age"] = 3
+    assert RecordView(Order, data)._validate().customer.age == 3
+
+def test_fields_are_not_hidden():
+    Doc = RecordType("Doc").add(defaults.String, "data").add(defaults.Int, "validate")
+    doc = RecordView(Doc, {"data": "x", "validate": 1})
+    assert doc.data == "x" and doc.validate == 1
+    assert doc._validate() is doc and doc._data == {"data": "x", "validate": 1}
+
+def test_changed_validators():
+    Score = NativeType("Score").set_validator(lambda thetype, value, bindings: value)
+    Game = RecordType("Game").add(Score, "score")
+    assert RecordView(Game, {"score": -1}).score == -1
+    def positive(thetype, value, bindings = None):
+        if value < 0: raise errors.ValidationError("Score must be positive")
+    Score.set_validator(positive)
+    try:
+        RecordView(Game, {"score": -1}).score
+        assert False
+    except errors.ValidationError as ve:
+        assert ve.path == ["score"]
+
+def test_views_do_not_keep_types_alive():
+    import gc
+    import weakref
+    def positive(thetype, value, bindings = None):
+        if value["age"] < 0: raise errors.ValidationError("Age must be positive")
+    Person = RecordType("Person").add(defaults.Int, "age").set_validator(positive)
+    Pet = RecordType("Pet").add(defaults.String, "name")
+    Owner = UnionType("Owner").add(Person, "person").add(Pet, "pet")
+    Home = RecordType("Home").add(Owner, "owner").add(Person, "person")
+    view = RecordView(Home, {"owner": {"age": 1}, "person": {"age": 2}})
+    assert view.owner == {"age": 1}
+    view._validate()
+    types = [weakref.ref(t) for t in (Home, Person, Owner)]
+    del view, Home, Person, Pet, Owner
+    gc.collect()
+    assert all(t() is None for t in types)
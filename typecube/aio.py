@@ -0,0 +1,41 @@
+
+# Type checking from asyncio code without blocking the event loop
+import asyncio
+import functools
+from typecube import checkers
+
+DEFAULT_BATCH_SIZE = 1000
+
+async def async_type_check(thetype, data, bindings = None, fail_fast = True, batch_size = DEFAULT_BATCH_SIZE,
+                           executor_threshold = None, executor = None, size = None, allow_cycles = False):
+    """ Checks that a given bit of data conforms to the type provided, like
+    checkers.type_check, but yields to the event loop after every
+    batch_size values are visited so other tasks keep running while large
+    payloads are validated.
+
+    If executor_threshold is given and the size of the data is at least
+    that, the whole check is handed off to an executor (the default
+    executor of the loop if executor is None) instead.  The size is the
+    number of elements or fields at the top of the data unless size is
+    given (eg as the length of the raw body).  Note that threads still
+    share the GIL so this mostly helps when the executor is a process pool
+    (in which case the type and data must be picklable) or when other
+    tasks are IO bound.
+
+    The data is walked iteratively (see checkers.type_check_steps) so deep
+    data does not hit the recursion limit either.
+    """
+    if executor_threshold is not None:
+        if size is None:
+            size = len(data) if isinstance(data, (dict, list, tuple)) else 0
+        if size >= executor_threshold:
+            check = functools.partial(checkers.type_check, thetype, data, bindings, fail_fast,
+                                      memoize = True, allow_cycles = allow_cycles)
+            return await asyncio.get_running_loop().run_in_executor(executor, check)
+
+    visited = 0
+    for _ in checkers.type_check_steps(thetype, data, bindings, fail_fast, allow_cycles):
+        visited += 1
+        if visited >= batch_size:
+            visited = 0
+            await asyncio.sleep(0)
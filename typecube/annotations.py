@@ -1,13 +1,12 @@
 import ipdb
 import traceback
 import pprint
-from collections import defaultdict
 
 class Annotatable(object):
     def __init__(self, annotations = None, docs = ""):
         if annotations is not None:
             assert type(annotations) is Annotations
-        self._annotations = annotations or Annotations()
+        self._annotations = annotations if annotations is not None else Annotations()
         self.docs = docs or ""
 
     def set_annotations(self, annotations):
@@ -26,67 +25,86 @@ class Annotatable(object):
     def annotations(self, value): self._annotations = value
 
     def get_annotation(self, name):
-        for annotation in self._annotations:
-            if annotation.name == name:
-                return annotation
-        return None
+        return self._annotations.get_first(name)
 
     def has_annotation(self, name):
-        return self.get_annotation(name) is not None
+        return self._annotations.has(name)
 
     def copy_from(self, another):
-        self._annotations = another._annotations[:]
+        self._annotations = Annotations(another._annotations)
         self.docs = another.docs
 
 class Annotations(object):
     """
     Keeps track of annotations.
+
+    Annotations are kept in the order they were added and are also indexed
+    by name so that lookups by name do not have to scan all annotations.
     """
-    def __init__(self, annotations = []):
+    __slots__ = ("_all_annotations", "_by_name")
+
+    def __init__(self, annotations = None):
         annotations = annotations or []
         if type(annotations) is Annotations:
             annotations = annotations.all_annotations
-        self.all_annotations = annotations
+        self._all_annotations = []
+        self._by_name = {}
+        for annotation in annotations:
+            self.add(annotation)
+
+    @property
+    def all_annotations(self):
+        """ A copy of the annotations, as they are also indexed by name and
+        so can only be changed via add. """
+        return list(self._all_annotations)
 
     def __iter__(self):
-        return iter(self.all_annotations)
+        return iter(self._all_annotations)
+
+    def __len__(self):
+        return len(self._all_annotations)
 
     def add(self, annotation):
-        self.all_annotations.append(annotation)
+        self._all_annotations.append(annotation)
+        named = self._by_name.get(annotation.name, None)
+        if named is None:
+            self._by_name[annotation.name] = [annotation]
+        else:
+            named.append(annotation)
 
     def has(self, name):
         """
         Returns True if there is atleast one annotation by a given name, otherwise False.
         """
-        for a in self.all_annotations:
-            if a.name == name:
-                return True
-        return False
+        return name in self._by_name
 
     def get_first(self, name):
         """
         Get the first annotation by a given name.
         """
-        for a in self.all_annotations:
-            if a.name == name:
-                return a
-        return None
+        named = self._by_name.get(name, None)
+        return named[0] if named else None
 
     def get_all(self, name):
         """
         Get all the annotation by a given name.
         """
-        return [annot for annot in self.all_annotations if annot.name == name]
+        return list(self._by_name.get(name, ()))
 
 class Annotation(object):
+    __slots__ = ("fqn", "_value", "_param_specs")
+
     def __init__(self, fqn, value = None, param_specs = None):
         self.fqn = fqn
         self._value = value
-        self._param_specs = defaultdict(list)
+        # Most annotations have no params so dont allocate a dict for them
+        self._param_specs = None
         speciter = param_specs or []
         if type(param_specs) is dict:
-            speciter = param_specs.iteritems()
+            speciter = param_specs.items()
         for k,v in speciter:
+            if self._param_specs is None:
+                self._param_specs = {}
             assert k not in self._param_specs, "Param %s already exists.  Consider using a list?" % k
             self._param_specs[k] = v
 
@@ -103,7 +121,7 @@ class Annotation(object):
         return self._param_specs is not None and len(self._param_specs) > 0
 
     def has_param(self, name):
-        return name in self._param_specs and len(self._param_specs[name]) > 0
+        return self._param_specs is not None and name in self._param_specs and len(self._param_specs[name]) > 0
 
     @property
     def params(self):
@@ -120,7 +138,7 @@ class Annotation(object):
         """
         Return all values of a param
         """
-        if name in self._param_specs:
+        if self._param_specs is not None and name in self._param_specs:
             return self._param_specs[name]
         return None
 
@@ -138,6 +156,6 @@ class Annotation(object):
         if self._value:
             out += ", Value: %s" % str(self._value)
         if self._param_specs:
-            out += ", Args: (%s)" % ", ".join(["[%s=%s]" % (x,y) for x,y in self._param_specs.iteritems()])
+            out += ", Args: (%s)" % ", ".join(["[%s=%s]" % (x,y) for x,y in self._param_specs.items()])
         out += ">"
         return out
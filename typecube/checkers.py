@@ -1,7 +1,12 @@
 
 # Type checkers for data given types
+import marshal
+import hashlib
+import weakref
+import collections
 from typecube import core
 from typecube import errors
+from typecube import utils
 
 class Bindings(object):
     class Entry(object):
@@ -22,53 +27,256 @@ class Bindings(object):
 
     def __setitem__(self, key, value):
         entry = self.entries.get(key, None)
-        if entry is not None and entry.level > self.level:
+        if entry is not None and entry.level == self.level:
             raise errors.ValidationError("Value for '%s' already exists in this level (%d)" % (key, self.level))
         self.entries[key] = Bindings.Entry(value, self.level, entry)
 
     def __getitem__(self, key):
-        while key in self.entries and self.entries[key].level > self.level:
-            self.entries[key] = self.entries[key].prev
-        if key not in self.entries: return None
-        return self.entries[key].value
+        entry = self.entries.get(key, None)
+        if entry is None: return None
+        return entry.value
 
     def push(self):
         self.level += 1
 
     def pop(self):
-        self.level += 1
+        """ Drops all values bound in the current level. """
+        for key,entry in list(self.entries.items()):
+            if entry.level == self.level:
+                if entry.prev is None:
+                    del self.entries[key]
+                else:
+                    self.entries[key] = entry.prev
+        self.level -= 1
+
+def type_check(thetype, data, bindings = None, fail_fast = True, memoize = False, allow_cycles = False):
+    """ Checks that a given bit of data conforms to the type provided.
+
+    By default a ValidationError is raised for the first value that does not
+    conform.  If fail_fast is False then all of the data is checked and a
+    ValidationErrors with every error found is raised instead.  The path to
+    each offending value is available from the errors.
+
+    If memoize is True then the data is walked iteratively (so arbitrarily
+    deep data does not hit the recursion limit) and each container object
+    is only validated once against each type however often it is shared
+    within the data.  Data that refers back to itself raises a
+    ValidationError unless allow_cycles is True, in which case a cycle is
+    assumed to be valid if the rest of the data is.
+    """
+    if not bindings: bindings = Bindings()
+    try:
+        if memoize:
+            for _ in _checking(thetype, data, bindings, fail_fast, allow_cycles): pass
+        else:
+            _check(thetype, data, bindings, fail_fast)
+    except errors.ValidationError as ve:
+        raise _collected(ve, fail_fast)
+
+def _collected(ve, fail_fast):
+    """ Returns the error to raise for an error found at the top of a check,
+    which is always a ValidationErrors when collecting all errors. """
+    if fail_fast or isinstance(ve, errors.ValidationErrors):
+        return ve
+    return errors.ValidationErrors([ve])
+
+# An object (eg a profiler) that is told about each value checked by
+# type_check: its enter(thetype) is called before a value is checked against
+# a type and its exit(thetype, failed) after.  Checkers compiled by compile
+# are instrumented with instrument_compiled instead.
+check_hook = None
+
+def _check(thetype, data, bindings, fail_fast):
+    hook = check_hook
+    if hook is not None: hook.enter(thetype)
+    try:
+        if isinstance(thetype, core.RecordType):
+            failures = []
+            for name,child in zip(thetype.child_names, thetype.child_types):
+                try:
+                    _check(child, _field_value(data, name), bindings, fail_fast)
+                except errors.ValidationError as ve:
+                    _failed(failures, ve, name, fail_fast)
+            if failures: raise errors.ValidationErrors(failures)
+        elif isinstance(thetype, core.TupleType):
+            _ensure_tuple(data, len(thetype.child_types))
+            failures = []
+            for index,(value,child_type) in enumerate(zip(data, thetype.child_types)):
+                try:
+                    _check(child_type, value, bindings, fail_fast)
+                except errors.ValidationError as ve:
+                    _failed(failures, ve, index, fail_fast)
+            if failures: raise errors.ValidationErrors(failures)
+        elif isinstance(thetype, core.UnionType):
+            index = _union_branch(thetype, data)
+            if index is not None:
+                try:
+                    _check(thetype.child_types[index], data[thetype.child_names[index]], bindings, fail_fast)
+                except errors.ValidationError as ve:
+                    raise ve.add_segment(thetype.child_names[index])
+            else:
+                _check_untagged(thetype.name, data, _union_index(thetype).candidates(data),
+                                lambda index: _check(thetype.child_types[index], data, bindings, fail_fast))
+        elif isinstance(thetype, core.TypeApp):
+            root_type = thetype.root_type
+            if isinstance(root_type, core.NativeType):
+                # Natives cannot be expanded so their args are bound directly
+                arg_types = [_bound_type(thetype.param_values.get(arg), bindings) for arg in root_type.args]
+                _check_native(root_type, arg_types, data, bindings, fail_fast)
+                if root_type.validator:
+                    root_type.validator(root_type, data, bindings)
+            else:
+                # Otherwise check against the (cached) monomorphic version of
+                # the application so no bindings are needed for its args
+                _check(thetype.concrete, data, bindings, fail_fast)
+        elif isinstance(thetype, core.TypeVar):
+            # Find the binding for this type variable
+            bound_type = bindings[thetype.name]
+            if bound_type is None:
+                raise errors.ValidationError("TypeVar(%s) is not bound to a type." % thetype.name)
+            _check(bound_type, data, bindings, fail_fast)
+        elif isinstance(thetype, core.NativeType):
+            # Native types are interesting - these can be plain types such as Int, Float etc
+            # or they can be generic types like Array<T>, Map<K,V>
+            # While plain types are fine, generic types (ie native types with args) pose a problem.
+            # How do we perform type checking on "contents" of the data given native types.
+            # We need native types to be able to apply mapper functions on data as they see fit.
+            # So to deal with custom validations on native types we need
+            # native types to expose mapper functors for us!!!
+            if thetype.args:
+                _check_native(thetype, [bindings[arg] for arg in thetype.args], data, bindings, fail_fast)
+
+        # Finally apply any other validators that were nominated 
+        # specifically for that particular type
+        if thetype.validator:
+            thetype.validator(thetype, data, bindings)
+    except BaseException as exc:
+        if hook is not None: hook.exit(thetype, isinstance(exc, errors.ValidationError))
+        raise
+    if hook is not None: hook.exit(thetype, False)
 
-def type_check(thetype, data, bindings = None):
-    """ Checks that a given bit of data conforms to the type provided  """
+def type_check_steps(thetype, data, bindings = None, fail_fast = True, allow_cycles = False):
+    """ Checks data like type_check with memoize = True, one value at a
+    time.  This is a generator that yields (None) after each value is
+    visited, so callers can do other work between steps (eg yield to an
+    event loop), and raises the error type_check would raise once it is
+    exhausted if the data does not conform.
+    """
     if not bindings: bindings = Bindings()
+    try:
+        yield from _checking(thetype, data, bindings, fail_fast, allow_cycles)
+    except errors.ValidationError as ve:
+        raise _collected(ve, fail_fast)
+
+# Types of values that may be shared within (or refer back to) data
+_CONTAINERS = (dict, list, tuple)
+
+def _checking(thetype, data, bindings, fail_fast, allow_cycles):
+    """ Checks data against a type without recursing.  This is a generator
+    that yields after each value is visited and raises a ValidationError
+    (once exhausted) if the data does not conform.
+
+    Each value being checked has a frame (a generator from _visit) on an
+    explicit stack.  Frames yield (type, value) requests for their children
+    and are sent back None or the ValidationError of the child.  Containers
+    that were validated against a type are remembered by identity so they
+    are not validated again, and containers that are still being validated
+    against a type are how cycles are found.
+    """
+    hook = check_hook
+    validated = set()
+    active = set()
+    stack = []
+    request, outcome = (thetype, data), None
+    while True:
+        if request is not None:
+            child_type, value = request
+            request = None
+            key = (id(value), id(child_type)) if type(value) in _CONTAINERS else None
+            if key is None or key not in validated:
+                if key in active:
+                    if not allow_cycles:
+                        outcome = errors.ValidationError("Cycle found in data")
+                else:
+                    if key is not None: active.add(key)
+                    if hook is not None: hook.enter(child_type)
+                    stack.append((key, child_type, _visit(child_type, value, bindings, fail_fast)))
+        if not stack:
+            if outcome is not None: raise outcome
+            return
+        key, frame_type, frame = stack[-1]
+        try:
+            request, outcome = frame.send(outcome), None
+        except StopIteration:
+            stack.pop()
+            if key is not None:
+                active.discard(key)
+                validated.add(key)
+            if hook is not None: hook.exit(frame_type, False)
+        except errors.ValidationError as ve:
+            stack.pop()
+            active.discard(key)
+            outcome = ve
+            if hook is not None: hook.exit(frame_type, True)
+        yield
+
+def _visit(thetype, data, bindings, fail_fast):
+    """ Checks a value against a type like type_check does, but as a
+    generator that yields a (type, value) request for each child value to be
+    checked and is sent back None or the ValidationError of the child, so
+    the checks can be driven from an explicit stack (by _checking).  Raises
+    a ValidationError if the value does not conform.
+    """
+    failures = []
     if isinstance(thetype, core.RecordType):
         for name,child in zip(thetype.child_names, thetype.child_types):
-            value = data[name]
-            type_check(child, value, bindings)
+            try:
+                value = _field_value(data, name)
+            except errors.ValidationError as ve:
+                _failed(failures, ve, name, fail_fast)
+                continue
+            ve = yield child, value
+            if ve is not None: _failed(failures, ve, name, fail_fast)
     elif isinstance(thetype, core.TupleType):
-        assert isinstance(data, tuple)
-        assert len(data) == len(thetype.child_types)
-        for value,child_type in zip(data, thetype.child_types):
-            type_check(child_type, value, bindings)
+        _ensure_tuple(data, len(thetype.child_types))
+        for index,(value,child) in enumerate(zip(data, thetype.child_types)):
+            ve = yield child, value
+            if ve is not None: _failed(failures, ve, index, fail_fast)
     elif isinstance(thetype, core.UnionType):
-        assert isinstance(thetype, dict)
-        children = [(name,child) for name,child in zip(thetype.child_names, thetype.child_types) if name in data]
-        assert len(fields) == 1, "0 or more than 1 entry in Union"
-        child_name,child_type = children[0]
-        type_check(child_type, data[child_name], bindings)
+        index = _union_branch(thetype, data)
+        if index is not None:
+            name = thetype.child_names[index]
+            ve = yield thetype.child_types[index], data[name]
+            if ve is not None: raise ve.add_segment(name)
+        else:
+            candidates = _union_index(thetype).candidates(data)
+            branch_failures = []
+            for index in candidates:
+                ve = yield thetype.child_types[index], data
+                if ve is None: break
+                branch_failures.append(ve)
+            else:
+                _no_branch(thetype.name, data, candidates, branch_failures)
     elif isinstance(thetype, core.TypeApp):
-        # Type applications are tricky.  These will "affect" bindings
-        bindings.push()
-        for k,v in thetype.param_values.items():
-            bindings[k] = v
-        type_check(thetype.root_type, data, bindings)
-        bindings.pop()
+        root_type = thetype.root_type
+        if isinstance(root_type, core.NativeType):
+            # Natives cannot be expanded so their args are bound directly
+            arg_types = [_bound_type(thetype.param_values.get(arg), bindings) for arg in root_type.args]
+            yield from _visit_native(root_type, arg_types, data, bindings, fail_fast)
+            if root_type.validator:
+                root_type.validator(root_type, data, bindings)
+        else:
+            # Otherwise check against the (cached) monomorphic version of
+            # the application so no bindings are needed for its args
+            ve = yield thetype.concrete, data
+            if ve is not None: raise ve
     elif isinstance(thetype, core.TypeVar):
         # Find the binding for this type variable
         bound_type = bindings[thetype.name]
         if bound_type is None:
             raise errors.ValidationError("TypeVar(%s) is not bound to a type." % thetype.name)
-        type_check(bound_type, data, bindings)
+        ve = yield bound_type, data
+        if ve is not None: raise ve
     elif isinstance(thetype, core.NativeType):
         # Native types are interesting - these can be plain types such as Int, Float etc
         # or they can be generic types like Array<T>, Map<K,V>
@@ -77,16 +285,542 @@ def type_check(thetype, data, bindings = None):
         # We need native types to be able to apply mapper functions on data as they see fit.
         # So to deal with custom validations on native types we need
         # native types to expose mapper functors for us!!!
-        if thetype.args and thetype.mapper_functor:
-            def type_check_functor(*values):
-                for arg, value in zip(thetype.args, values):
-                    bound_type = bindings[arg]
-                    if bound_type is None:
-                        raise errors.ValidationError("Arg(%s) is not bound to a type." % arg)
-                    type_check(bound_type, value)
-            thetype.mapper_functor(type_check_functor, data)
+        if thetype.args:
+            yield from _visit_native(thetype, [bindings[arg] for arg in thetype.args], data, bindings, fail_fast)
+    if failures: raise errors.ValidationErrors(failures)
 
     # Finally apply any other validators that were nominated 
     # specifically for that particular type
     if thetype.validator:
         thetype.validator(thetype, data, bindings)
+
+def _visit_native(thetype, arg_types, data, bindings, fail_fast):
+    """ Checks the contents of a native value by having its mapper functor
+    collect the contents, which are then checked as children. """
+    if not thetype.mapper_functor: return
+    if None not in arg_types and None not in map(_python_type, arg_types):
+        # Contents of natives can be checked (in bulk) without recursing
+        _check_native(thetype, arg_types, data, bindings, fail_fast)
+        return
+    contents = []
+    thetype.mapper_functor(lambda *values: contents.append(values), data)
+    failures = []
+    for position,values in enumerate(contents):
+        segment = values[0] if type(data) is dict else position
+        for arg,arg_type,value in zip(thetype.args, arg_types, values):
+            if arg_type is None:
+                ve = errors.ValidationError("Arg(%s) is not bound to a type." % arg)
+            else:
+                ve = yield arg_type, value
+            if ve is not None: _failed(failures, ve, segment, fail_fast)
+    if failures: raise errors.ValidationErrors(failures)
+
+class _UnionIndex(object):
+    """ Discriminators of the branches of a union so values of untagged
+    unions are only checked against the branches they could belong to.
+
+    Branches are indexed by the python type of their values where this is
+    known.  Records are further indexed by the fields that distinguish them
+    from the other records in the union.  Branches whose values cannot be
+    told apart up front are always candidates.
+    """
+    def __init__(self, thetype):
+        self.size = len(thetype.child_types)
+        self.by_python_type = {}
+        self.by_field = {}
+        self.records = []
+        self.always = []
+        records = {}
+        for index,child in enumerate(thetype.child_types):
+            resolved = _resolved(child)
+            if isinstance(resolved, core.RecordType):
+                records[index] = resolved.child_indexes
+                continue
+            python_type = _python_type_of(resolved)
+            if python_type is None:
+                self.always.append(index)
+            else:
+                self.by_python_type.setdefault(python_type, []).append(index)
+        for index,fields in records.items():
+            distinct = [name for name in fields
+                        if not any(name in others for other,others in records.items() if other != index)]
+            for name in distinct:
+                self.by_field.setdefault(name, []).append(index)
+            if not distinct:
+                self.records.append(index)
+
+    def candidates(self, data):
+        """ Returns the indexes (in order) of the branches a value can belong to. """
+        candidates = self.always + self.by_python_type.get(type(data), [])
+        if type(data) is dict and (self.by_field or self.records):
+            by_field = self.by_field
+            matches = [index for name in data if name in by_field for index in by_field[name]]
+            if not matches:
+                # Without distinguishing fields any record could match
+                matches = [index for indexes in by_field.values() for index in indexes]
+            candidates = candidates + matches + self.records
+        return sorted(set(candidates))
+
+# Discriminator indexes of unions by type
+_union_indexes = weakref.WeakKeyDictionary()
+
+def _union_index(thetype):
+    index = _union_indexes.get(thetype, None)
+    if index is None or index.size != len(thetype.child_types):
+        index = _union_indexes[thetype] = _UnionIndex(thetype)
+    return index
+
+def _union_branch(thetype, data):
+    """ Returns the index of the branch of a tagged union value (a dict with
+    the name of the branch as its only key) or None if it is not tagged. """
+    if type(data) is dict and len(data) == 1:
+        for name in data:
+            return thetype.child_indexes.get(name, None)
+    return None
+
+def _check_untagged(union_name, data, candidates, check_branch):
+    """ Checks an untagged union value against each candidate branch until
+    one accepts it. """
+    failures = []
+    for index in candidates:
+        try:
+            check_branch(index)
+            return
+        except errors.ValidationError as ve:
+            failures.append(ve)
+    _no_branch(union_name, data, candidates, failures)
+
+def _no_branch(union_name, data, candidates, failures):
+    if len(failures) == 1:
+        raise failures[0]
+    raise errors.ValidationError("%s does not match any of the %d candidate branches of union %s" %
+                                 (str(data), len(candidates), union_name))
+
+def _resolved(thetype):
+    if isinstance(thetype, core.TypeApp) and not isinstance(thetype.root_type, core.NativeType):
+        return thetype.concrete
+    return thetype
+
+def _python_type_of(thetype):
+    """ Returns the python type all values of a type have if it is known. """
+    if isinstance(thetype, core.RecordType):
+        return dict
+    if isinstance(thetype, core.TupleType):
+        return tuple
+    root_type = thetype.root_type if isinstance(thetype, core.TypeApp) else thetype
+    mapper_functor = getattr(root_type, "mapper_functor", None)
+    if mapper_functor is not None:
+        return getattr(mapper_functor, "python_type", None)
+    if isinstance(thetype, core.NativeType) and thetype.validator is not None:
+        return getattr(thetype.validator, "python_type", None)
+    return None
+
+def _field_value(data, name):
+    try:
+        return data[name]
+    except (KeyError, IndexError, TypeError):
+        raise errors.ValidationError("Field is missing")
+
+def _ensure_tuple(data, size):
+    if type(data) is not tuple:
+        raise errors.ValidationError("%s needs to be a tuple, found %s" % (str(data), str(type(data))))
+    if len(data) != size:
+        raise errors.ValidationError("Tuple needs %d values, found %d" % (size, len(data)))
+
+def _failed(failures, ve, segment, fail_fast):
+    """ Records an error found within a container at the given segment, or
+    raises it right away if failing fast. """
+    ve.add_segment(segment)
+    if fail_fast: raise ve
+    failures.append(ve)
+
+def _bound_type(thetype, bindings):
+    """ Returns the type a type variable is bound to or the type itself if it
+    is not a type variable. """
+    if isinstance(thetype, core.TypeVar):
+        return bindings[thetype.name]
+    return thetype
+
+def _check_native(thetype, arg_types, data, bindings, fail_fast):
+    """ Checks the contents of a native type by having its mapper functor
+    apply the checks for the types bound to each of its args. """
+    if not thetype.mapper_functor: return
+    def arg_check(arg, bound_type):
+        if bound_type is None:
+            return _unbound_checker("Arg", arg)
+        return lambda value: _check(bound_type, value, bindings, fail_fast)
+    arg_checks = [arg_check(arg, bound_type) for arg,bound_type in zip(thetype.args, arg_types)]
+    def type_check_functor(*values):
+        for check_arg,value in zip(arg_checks, values):
+            check_arg(value)
+    type_check_functor.python_types = tuple(map(_python_type, arg_types))
+    try:
+        thetype.mapper_functor(type_check_functor, data)
+    except errors.ValidationError:
+        _locate_failures(thetype.mapper_functor, arg_checks, data, fail_fast)
+        raise
+
+class _StopLocating(Exception): pass
+
+def _locate_failures(mapper_functor, arg_checks, data, fail_fast):
+    """ Called when mapping over the contents of a native value has failed.
+    Maps over the value again to find where the contents failed so that
+    the path to the failures is only worked out when there are failures.
+    Raises the located error(s), if any.
+
+    The segment of a failure is its key if the value is a dict, otherwise
+    the position in which the mapper functor visited it.
+    """
+    failures = []
+    position = [0]
+    def locating_functor(*values):
+        for check_arg,value in zip(arg_checks, values):
+            try:
+                check_arg(value)
+            except errors.ValidationError as ve:
+                failures.append(ve.add_segment(values[0] if type(data) is dict else position[0]))
+                if fail_fast: raise _StopLocating()
+        position[0] += 1
+    try:
+        mapper_functor(locating_functor, data)
+    except _StopLocating:
+        pass
+    if failures:
+        if fail_fast: raise failures[0]
+        raise errors.ValidationErrors(failures)
+
+def _python_type(thetype):
+    """ Returns the python type values of a type must exactly be of, if that
+    alone decides whether a value is valid, otherwise None. """
+    if isinstance(thetype, core.NativeType) and not thetype.args:
+        return getattr(thetype.validator, "python_type", None)
+    return None
+
+def type_check_many(thetype, values, fail_fast = True):
+    """ Checks that every value in an iterable conforms to the type provided.
+
+    The type is only compiled once for the whole batch.  Raises a
+    ValidationError for the first value that does not conform, or if
+    fail_fast is False, a ValidationErrors with all errors in all values.
+    The index of a value is the first segment of the path of its errors.
+    """
+    check = compile(thetype, fail_fast = fail_fast)
+    python_types = getattr(check, "python_types", None)
+    if python_types and type(values) is list:
+        if utils.all_of_type(values, python_types[0]): return
+    failures = []
+    for index,value in enumerate(values):
+        try:
+            check(value)
+        except errors.ValidationError as ve:
+            _failed(failures, ve, index, fail_fast)
+    if failures: raise errors.ValidationErrors(failures)
+
+def compile(thetype, bindings = None, fail_fast = True):
+    """ Compiles a type into a validator function.
+
+    The type graph is walked once and turned into a set of composed closures
+    with type variables resolved up front, so that validating a value only
+    performs the actual checks instead of re-dispatching on the kind of each
+    type node.  The returned function takes a single value and raises a
+    ValidationError if it does not conform to the type (or a
+    ValidationErrors with all errors if fail_fast is False).
+
+    Note that validators are captured when the type is compiled so the type
+    must be recompiled if any validators change.  Also since all bindings are
+    resolved during compilation, validators are invoked with bindings = None.
+
+    bindings is an optional dict of type variable names to the types they are
+    bound to.
+    """
+    return _compile(thetype, bindings, fail_fast, False)
+
+def _compile(thetype, bindings, fail_fast, weak):
+    check = _Compiler(bindings, fail_fast, weak).compile(thetype)
+    if fail_fast: return check
+    def check_all(data):
+        try:
+            return check(data)
+        except errors.ValidationError as ve:
+            raise _collected(ve, fail_fast)
+    python_types = getattr(check, "python_types", None)
+    if python_types is not None:
+        check_all.python_types = python_types
+    return check_all
+
+# Checkers compiled by compiled() by type along with what they were compiled
+# against, and then by fail_fast
+_compiled = weakref.WeakKeyDictionary()
+
+def compiled(thetype, fail_fast = True):
+    """ Returns the checker compiled for a type, compiling it the first time
+    only.  The checkers are dropped along with their types and are compiled
+    again once any validator or the structure of any type changes or
+    instrument_compiled is changed.
+
+    The cached checkers only refer to types weakly (so they do not keep
+    their types alive) which means validators are passed None as the type
+    if a checker is called after its type was dropped.  Use compile for
+    checkers that outlive their types. """
+    generation = (core.validator_generation, core.structure_generation, instrument_compiled)
+    entry = _compiled.get(thetype, None)
+    if entry is None or entry[0] != generation:
+        entry = _compiled[thetype] = (generation, {})
+    checks = entry[1]
+    check = checks.get(fail_fast, None)
+    if check is None:
+        check = checks[fail_fast] = _compile(thetype, None, fail_fast, True)
+    return check
+
+def clear_compiled():
+    """ Drops all checkers cached by compiled(). """
+    _compiled.clear()
+
+# A function that is given each type and the checker compiled for it and
+# returns the checker to use instead (eg to profile it).  Since this is
+# applied when compiling, checkers cost nothing extra when it is not set.
+instrument_compiled = None
+
+def _accept(data):
+    return data
+
+def _unbound_checker(kind, name):
+    def check(data):
+        raise errors.ValidationError("%s(%s) is not bound to a type." % (kind, name))
+    return check
+
+class _Compiler(object):
+    def __init__(self, bindings, fail_fast, weak = False):
+        self.env = dict(bindings or {})
+        self.fail_fast = fail_fast
+        # Whether checkers only refer to types weakly
+        self.weak = weak
+        self.memo = {}
+
+    def resolve(self, thetype):
+        """ Resolves a type against the bindings.  Returns None if the type
+        is a type variable that is not bound. """
+        while isinstance(thetype, core.TypeVar):
+            if thetype.name not in self.env: return None
+            thetype = self.env[thetype.name]
+        return thetype
+
+    def compile(self, thetype):
+        """ Compiles a type (once per call to compile).  Types that are
+        still being compiled are referred to via a forwarder so recursive
+        types compile to recursive checkers. """
+        key = id(thetype)
+        if key in self.memo: return self.memo[key]
+        compiled = []
+        self.memo[key] = lambda data: compiled[0](data)
+        check = self.compile_type(thetype)
+        if instrument_compiled is not None:
+            check = instrument_compiled(thetype, check)
+        compiled.append(check)
+        self.memo[key] = check
+        return check
+
+    def compile_type(self, thetype):
+        check = None
+        if isinstance(thetype, core.RecordType):
+            check = self.compile_record(thetype)
+        elif isinstance(thetype, core.TupleType):
+            check = self.compile_tuple(thetype)
+        elif isinstance(thetype, core.UnionType):
+            check = self.compile_union(thetype)
+        elif isinstance(thetype, core.TypeApp):
+            root_type = thetype.root_type
+            if isinstance(root_type, core.NativeType):
+                arg_types = [self.resolve(thetype.param_values.get(arg)) for arg in root_type.args]
+                check = self.with_validator(root_type, self.compile_native(root_type, arg_types))
+            else:
+                check = self.compile(thetype.concrete)
+        elif isinstance(thetype, core.TypeVar):
+            bound_type = self.resolve(thetype)
+            if bound_type is None:
+                check = _unbound_checker("TypeVar", thetype.name)
+            else:
+                check = self.compile(bound_type)
+        elif isinstance(thetype, core.NativeType):
+            if thetype.args:
+                check = self.compile_native(thetype, [self.resolve(self.env.get(arg)) for arg in thetype.args])
+        return self.with_validator(thetype, check)
+
+    def with_validator(self, thetype, check):
+        """ Combines the checks of a type with its own validator if any. """
+        validator = thetype.validator
+        if validator is None:
+            return check or _accept
+        type_ref = weakref.ref(thetype) if self.weak else (lambda: thetype)
+        if check is None:
+            def validate(data):
+                validator(type_ref(), data, None)
+            python_type = getattr(validator, "python_type", None)
+            if python_type is not None:
+                validate.python_types = (python_type,)
+            return validate
+        def check_and_validate(data):
+            check(data)
+            validator(type_ref(), data, None)
+        return check_and_validate
+
+    def compile_record(self, thetype):
+        fields = [(name, self.compile(child)) for name,child in zip(thetype.child_names, thetype.child_types)]
+        if self.fail_fast:
+            def check(data):
+                for name,check_child in fields:
+                    try:
+                        value = data[name]
+                    except (KeyError, IndexError, TypeError):
+                        raise errors.ValidationError("Field is missing", [name])
+                    try:
+                        check_child(value)
+                    except errors.ValidationError as ve:
+                        raise ve.add_segment(name)
+        else:
+            def check(data):
+                failures = []
+                for name,check_child in fields:
+                    try:
+                        check_child(_field_value(data, name))
+                    except errors.ValidationError as ve:
+                        failures.append(ve.add_segment(name))
+                if failures: raise errors.ValidationErrors(failures)
+        return check
+
+    def compile_union(self, thetype):
+        branches = [self.compile(child) for child in thetype.child_types]
+        index = _UnionIndex(thetype)
+        child_indexes = thetype.child_indexes
+        # Refer to the union by name only so checkers do not keep it alive
+        union_name = thetype.name
+        def check(data):
+            if type(data) is dict and len(data) == 1:
+                for name in data:
+                    branch = child_indexes.get(name, None)
+                    if branch is not None:
+                        try:
+                            return branches[branch](data[name])
+                        except errors.ValidationError as ve:
+                            raise ve.add_segment(name)
+            _check_untagged(union_name, data, index.candidates(data), lambda index: branches[index](data))
+        return check
+
+    def compile_tuple(self, thetype):
+        children = [self.compile(child) for child in thetype.child_types]
+        num_children = len(children)
+        fail_fast = self.fail_fast
+        def check(data):
+            _ensure_tuple(data, num_children)
+            failures = []
+            for index,(value,check_child) in enumerate(zip(data, children)):
+                try:
+                    check_child(value)
+                except errors.ValidationError as ve:
+                    _failed(failures, ve, index, fail_fast)
+            if failures: raise errors.ValidationErrors(failures)
+        return check
+
+    def compile_native(self, thetype, arg_types):
+        """ Compiles native types with arguments by handing compiled checkers
+        of the types bound to each argument to the native type's mapper
+        functor. """
+        mapper_functor = thetype.mapper_functor
+        if not mapper_functor: return None
+        arg_checks = []
+        for arg,bound_type in zip(thetype.args, arg_types):
+            if bound_type is None:
+                arg_checks.append(_unbound_checker("Arg", arg))
+            else:
+                arg_checks.append(self.compile(bound_type))
+
+        if len(arg_checks) == 1:
+            functor = arg_checks[0]
+        elif len(arg_checks) == 2:
+            first, second = arg_checks
+            def functor(a, b):
+                first(a)
+                second(b)
+        else:
+            def functor(*values):
+                for check_arg,value in zip(arg_checks, values):
+                    check_arg(value)
+        if len(arg_checks) > 1:
+            functor.python_types = tuple(getattr(check_arg, "python_types", (None,))[0] for check_arg in arg_checks)
+
+        fail_fast = self.fail_fast
+        def check(data):
+            try:
+                mapper_functor(functor, data)
+            except errors.ValidationError:
+                _locate_failures(mapper_functor, arg_checks, data, fail_fast)
+                raise
+        return check
+
+class ValidationCache(object):
+    """ A bounded (least recently used) cache of values that were found to
+    conform to types, so values that repeat are only validated once.
+
+    Values are keyed by the type and a fingerprint of their contents, so
+    values can be (mutable) dicts, lists etc as long as they only contain
+    the builtin types marshal supports.  Values of other types are always
+    validated.  Only successful validations are cached.
+
+    All cached results are dropped whenever the validator of any type is
+    replaced with set_validator or children are added to any type.  Call
+    invalidate() if types or validators change in any other way.
+    """
+    def __init__(self, maxsize = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._generation = (core.validator_generation, core.structure_generation)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+    def invalidate(self, thetype = None):
+        """ Drops the cached results for a type or for all types. """
+        if thetype is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] is thetype]:
+                del self._entries[key]
+
+    def type_check(self, thetype, data, bindings = None, fail_fast = True):
+        """ Checks that a value conforms to a type (see type_check) unless
+        the same value was found to conform before. """
+        generation = (core.validator_generation, core.structure_generation)
+        if self._generation != generation:
+            self._generation = generation
+            self._entries.clear()
+        # Results depend on the bindings so only those without are cached
+        key = None if bindings else fingerprint(data)
+        if key is not None:
+            key = (thetype, key)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return
+        self.misses += 1
+        type_check(thetype, data, bindings, fail_fast)
+        if key is not None:
+            self._entries[key] = True
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+def fingerprint(data):
+    """ Returns a digest of the contents of a value or None if the value
+    contains types other than the builtin types marshal supports. """
+    try:
+        return hashlib.blake2b(marshal.dumps(data), digest_size = 16).digest()
+    except ValueError:
+        return None
@@ -0,0 +1,200 @@
+
+# Generates native classes for record and tuple types
+import weakref
+import keyword
+from typecube import core
+from typecube import checkers
+from typecube import errors
+
+# Generated classes by the key of their type and whether they validate.
+# Classes are held weakly (they refer to their types) and live as long as
+# they or their instances are used.
+_classes = weakref.WeakValueDictionary()
+
+class Generated(object):
+    """ Base of all classes generated out of types. """
+    __slots__ = ()
+    __type__ = None
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__: return False
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join("%s=%r" % (name, getattr(self, name)) for name in self.__slots__))
+
+class GeneratedRecord(Generated):
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Creates an instance out of a dict of field values.  Fields that
+        are records or tuples are converted to instances of their classes. """
+        values = []
+        for name,field_class in zip(cls.__slots__, cls._field_classes):
+            try:
+                value = data[name]
+            except (KeyError, IndexError, TypeError):
+                raise errors.ValidationError("Field is missing", [name])
+            if field_class is not None:
+                try:
+                    value = field_class._from_data(value)
+                except errors.ValidationError as ve:
+                    raise ve.add_segment(name)
+            values.append(value)
+        return cls(*values)
+
+    def to_dict(self):
+        """ Returns the fields of the instance as a dict with instances of
+        other generated classes converted as well. """
+        return dict((name, _to_data(getattr(self, name))) for name in self.__slots__)
+
+    _to_data = to_dict
+
+    @classmethod
+    def _from_data(cls, data):
+        if isinstance(data, cls): return data
+        return cls.from_dict(data)
+
+class GeneratedTuple(Generated):
+    __slots__ = ()
+
+    @classmethod
+    def from_tuple(cls, data):
+        """ Creates an instance out of a tuple (or list) of values. """
+        checkers._ensure_tuple(data, len(cls.__slots__))
+        values = []
+        for index,(value,field_class) in enumerate(zip(data, cls._field_classes)):
+            if field_class is not None:
+                try:
+                    value = field_class._from_data(value)
+                except errors.ValidationError as ve:
+                    raise ve.add_segment(index)
+            values.append(value)
+        return cls(*values)
+
+    def to_tuple(self):
+        return tuple(_to_data(getattr(self, name)) for name in self.__slots__)
+
+    _to_data = to_tuple
+
+    @classmethod
+    def _from_data(cls, data):
+        if isinstance(data, cls): return data
+        return cls.from_tuple(data)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+def _to_data(value):
+    if isinstance(value, Generated):
+        return value._to_data()
+    return value
+
+def make_class(thetype, validate = False):
+    """ Returns a class for instances of a record or tuple type (or an
+    application of one).  Classes are generated once per type (or per
+    root type and param values of applications) and cached for as long as
+    they or their instances are in use.
+
+    The generated classes use __slots__ (so instances are much smaller than
+    the equivalent dicts) and have positional constructors taking the fields
+    in the order they were declared.  Fields of tuples are named _0, _1 etc.
+    Fields that are records or tuples themselves hold instances of their
+    generated classes.
+
+    If validate is True then the values passed to the constructor are
+    validated with the checkers compiled for each field and a
+    ValidationError is raised if they do not conform.  Instances of
+    generated classes are trusted to be valid.  Note that (just like
+    compiled checkers) the validators are captured when the class is
+    generated.
+    """
+    data_type = _data_type(thetype)
+    if data_type is None:
+        raise errors.TCException("Classes can only be generated for records and tuples without unbound args")
+    key = (_class_key(thetype), validate)
+    cls = _classes.get(key, None)
+    if cls is None:
+        thetype = data_type
+        cls = _generate_class(thetype, validate)
+        _classes[key] = cls
+        # Classes of fields are generated after the class is cached so
+        # recursive types refer back to their own class
+        cls._field_classes = tuple(_field_class(child, validate) for child in thetype.child_types)
+        if validate:
+            cls._field_checks = tuple(_field_check(child, field_class)
+                                      for child,field_class in zip(thetype.child_types, cls._field_classes))
+    return cls
+
+def _class_key(thetype):
+    """ Applications are keyed by what they apply (rather than by identity)
+    as they are only interned while they are in use. """
+    if isinstance(thetype, core.TypeApp):
+        return thetype.root_type, frozenset(thetype.param_values.items())
+    return thetype
+
+def _data_type(thetype):
+    if isinstance(thetype, core.TypeApp) and not isinstance(thetype.root_type, core.NativeType):
+        thetype = thetype.concrete
+    if isinstance(thetype, (core.RecordType, core.TupleType)) and not thetype.args:
+        return thetype
+    return None
+
+def _field_class(thetype, validate):
+    if _data_type(thetype) is None:
+        return None
+    return make_class(thetype, validate)
+
+def _field_check(thetype, field_class):
+    if field_class is not None:
+        def check_instance(value):
+            if not isinstance(value, field_class):
+                raise errors.ValidationError("%s needs to be an instance of %s" % (repr(value), field_class.__name__))
+        return check_instance
+    return checkers.compile(thetype)
+
+def _generate_class(thetype, validate):
+    if isinstance(thetype, core.RecordType):
+        base, names = GeneratedRecord, list(thetype.child_names)
+        for name in names:
+            if not name.isidentifier() or keyword.iskeyword(name) or name.startswith("__"):
+                raise errors.TCException("Field '%s' cannot be an attribute" % name)
+    else:
+        base, names = GeneratedTuple, ["_%d" % index for index in range(len(thetype.child_types))]
+
+    # The constructor is generated so instances are created with plain
+    # positional assignments
+    lines = ["def __init__(self%s):" % "".join(", " + name for name in names)]
+    for name in names:
+        lines.append("    self.%s = %s" % (name, name))
+    if validate:
+        lines.append("    _validate(self)")
+    if not names:
+        lines.append("    pass")
+    namespace = {"_validate": _validate}
+    exec("\n".join(lines), namespace)
+
+    class_name = thetype.name or base.__name__
+    attrs = {"__slots__": tuple(names), "__init__": namespace["__init__"], "__type__": thetype}
+    return type(class_name, (base,), attrs)
+
+def _validate(instance):
+    cls = instance.__class__
+    for index,(name,check) in enumerate(zip(cls.__slots__, cls._field_checks)):
+        try:
+            check(getattr(instance, name))
+        except errors.ValidationError as ve:
+            raise ve.add_segment(name if isinstance(instance, GeneratedRecord) else index)
+    validator = cls.__type__.validator
+    if validator is not None:
+        validator(cls.__type__, instance._to_data(), None)
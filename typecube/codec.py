@@ -0,0 +1,416 @@
+
+# A compact binary encoding of values driven by their types
+import sys
+import struct
+from typecube import core
+from typecube import defaults
+from typecube import errors
+from typecube.utils import all_of_type
+
+# struct formats of the fixed width native types.  All values are encoded
+# little endian.  Floats are encoded as doubles (like python floats) so
+# they are not rounded.
+FORMATS = {
+    defaults.Byte: "B",
+    defaults.Int: "i",
+    defaults.Long: "q",
+    defaults.Float: "d",
+    defaults.Double: "d",
+}
+
+_LENGTH = struct.Struct("<I")
+
+def register_format(thetype, fmt):
+    """ Registers the struct format (eg "h") of a fixed width native type.
+    Codecs compiled before this are not affected. """
+    if len(fmt) != 1 or struct.calcsize("<" + fmt) == 0:
+        raise errors.TCException("Invalid format '%s'" % fmt)
+    FORMATS[thetype] = fmt
+
+def _can_cast(fmt):
+    """ Arrays can only be returned as views over the encoded bytes if the
+    machine representation of their elements matches the encoding. """
+    try:
+        return sys.byteorder == "little" and struct.calcsize(fmt) == struct.calcsize("<" + fmt)
+    except struct.error:
+        return False
+
+class Codec(object):
+    """ Encodes values of a type to bytes and decodes them back.
+
+    Encoders and decoders are compiled once per type.  Consecutive fixed
+    width fields of records and tuples are packed and unpacked with a
+    single precompiled struct.  Strings, arrays and maps are prefixed by
+    their (unsigned 32 bit) length and unions by the index of the branch
+    the value belongs to.
+
+    Values of natives with validators of an exact python type (see
+    defaults) are checked to be of that type before they are packed, eg
+    True is not encoded as an Int nor 1 as a Float.  Likewise arrays need
+    to be lists and maps and records dicts.
+
+    Decoding reads directly from any buffer (bytes, bytearray, memoryview,
+    mmap etc) without copying it.  Arrays of fixed width natives are
+    returned as memoryviews over the buffer, so the buffer must be kept
+    alive (and an mmap cannot be closed) while they are in use; convert
+    them with tolist() if needed.
+    """
+    def __init__(self, thetype):
+        self.thetype = thetype
+        compiler = _Compiler()
+        self._encode = compiler.encoder(thetype)
+        self._decode = compiler.decoder(thetype)
+
+    def encode(self, value):
+        out = bytearray()
+        self._encode(value, out)
+        return bytes(out)
+
+    def encode_into(self, value, out):
+        """ Appends the encoding of a value to a bytearray. """
+        self._encode(value, out)
+        return out
+
+    def decode(self, buffer, offset = 0):
+        """ Decodes a value that must take up the rest of the buffer. """
+        view = _byte_view(buffer)
+        value, end = self._decode(view, offset)
+        if end != len(view):
+            raise errors.DecodeError("%d unexpected trailing bytes" % (len(view) - end), end)
+        return value
+
+    def decode_from(self, buffer, offset = 0):
+        """ Decodes a value at an offset in a buffer and returns the value
+        and the offset after it. """
+        return self._decode(_byte_view(buffer), offset)
+
+def _byte_view(buffer):
+    view = memoryview(buffer)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+def _unpack_from(unpacker, view, offset):
+    try:
+        return unpacker.unpack_from(view, offset)
+    except struct.error:
+        raise errors.DecodeError("Unexpected end of buffer", offset)
+
+def _read_length(view, offset):
+    return _unpack_from(_LENGTH, view, offset)[0], offset + 4
+
+def _check_end(view, end, offset):
+    if end > len(view):
+        raise errors.DecodeError("Unexpected end of buffer", offset)
+
+def _check_fixed(thetype, value):
+    """ Raises the ValidationError of the validator of a type for a value
+    that is not of its python type. """
+    thetype.validator(thetype, value, None)
+    raise errors.ValidationError("%s needs to be a %s" % (repr(value), _python_type(thetype).__name__))
+
+def _check_container(value, python_type):
+    """ Containers are checked to be of the exact python type the checkers
+    expect, eg a dict is not encoded as an array of its keys. """
+    if type(value) is not python_type:
+        raise errors.ValidationError("%s needs to be a %s, found %s" % (repr(value), python_type.__name__, type(value)))
+
+def _python_type(thetype):
+    return getattr(thetype.validator, "python_type", None)
+
+class _Compiler(object):
+    def __init__(self):
+        self.encoders = {}
+        self.decoders = {}
+
+    def _memoized(self, memo, thetype, make):
+        """ Types still being compiled are referred to via a forwarder so
+        recursive types compile to recursive functions. """
+        key = id(thetype)
+        if key in memo: return memo[key]
+        compiled = []
+        memo[key] = lambda *args: compiled[0](*args)
+        function = make(thetype)
+        compiled.append(function)
+        memo[key] = function
+        return function
+
+    def encoder(self, thetype):
+        return self._memoized(self.encoders, thetype, self.make_encoder)
+
+    def decoder(self, thetype):
+        return self._memoized(self.decoders, thetype, self.make_decoder)
+
+    def resolve(self, thetype):
+        if isinstance(thetype, core.TypeApp) and not isinstance(thetype.root_type, core.NativeType):
+            thetype = thetype.concrete
+        if thetype.args or isinstance(thetype, core.TypeVar):
+            raise errors.TCException("Cannot encode %s as it has unbound type variables" % repr(thetype))
+        return thetype
+
+    def fixed_format(self, thetype):
+        return FORMATS.get(self.resolve(thetype), None)
+
+    def fields(self, thetype):
+        """ Returns the fields of a record or tuple as a list of
+        (None, accessor, type) and groups consecutive fixed width fields as
+        (formats, accessors, types). """
+        if isinstance(thetype, core.RecordType):
+            keys = list(thetype.child_names)
+        else:
+            keys = list(range(len(thetype.child_types)))
+        groups = []
+        for key,child in zip(keys, thetype.child_types):
+            fmt = self.fixed_format(child)
+            if fmt is not None and groups and groups[-1][0] is not None:
+                groups[-1][0].append(fmt)
+                groups[-1][1].append(key)
+                groups[-1][2].append(self.resolve(child))
+            elif fmt is not None:
+                groups.append(([fmt], [key], [self.resolve(child)]))
+            else:
+                groups.append((None, key, child))
+        return groups
+
+    def make_encoder(self, thetype):
+        thetype = self.resolve(thetype)
+        fmt = FORMATS.get(thetype, None)
+        if fmt is not None:
+            packer = struct.Struct("<" + fmt)
+            python_type = _python_type(thetype)
+            def encode_fixed(value, out):
+                if python_type is not None and type(value) is not python_type:
+                    _check_fixed(thetype, value)
+                try:
+                    out += packer.pack(value)
+                except struct.error as exc:
+                    raise errors.ValidationError("Cannot encode %s as %s: %s" % (repr(value), thetype.name, exc))
+            return encode_fixed
+        if thetype is defaults.String:
+            def encode_string(value, out):
+                try:
+                    encoded = value.encode("utf-8")
+                except AttributeError:
+                    raise errors.ValidationError("%s needs to be a string, found %s" % (repr(value), type(value)))
+                out += _LENGTH.pack(len(encoded))
+                out += encoded
+            return encode_string
+        if isinstance(thetype, core.TypeApp) and thetype.root_type in (defaults.Array, defaults.List):
+            return self.array_encoder(thetype.param_values["T"])
+        if isinstance(thetype, core.TypeApp) and thetype.root_type is defaults.Map:
+            encode_key = self.encoder(thetype.param_values["K"])
+            encode_value = self.encoder(thetype.param_values["V"])
+            def encode_map(value, out):
+                _check_container(value, dict)
+                out += _LENGTH.pack(len(value))
+                for k,v in value.items():
+                    encode_key(k, out)
+                    try:
+                        encode_value(v, out)
+                    except errors.ValidationError as ve:
+                        raise ve.add_segment(k)
+            return encode_map
+        if isinstance(thetype, (core.RecordType, core.TupleType)):
+            return self.struct_encoder(thetype)
+        if isinstance(thetype, core.UnionType):
+            branches = dict((name, (index, self.encoder(child)))
+                            for index,(name,child) in enumerate(zip(thetype.child_names, thetype.child_types)))
+            def encode_union(value, out):
+                if type(value) is not dict or len(value) != 1:
+                    raise errors.ValidationError("Union values need to be a dict with a single branch")
+                (name, child), = value.items()
+                if name not in branches:
+                    raise errors.ValidationError("Invalid branch '%s'" % name)
+                index, encode_child = branches[name]
+                out += _LENGTH.pack(index)
+                try:
+                    encode_child(child, out)
+                except errors.ValidationError as ve:
+                    raise ve.add_segment(name)
+            return encode_union
+        raise errors.TCException("No binary encoding for %s" % repr(thetype))
+
+    def array_encoder(self, element_type):
+        fmt = self.fixed_format(element_type)
+        if fmt is not None:
+            element_type = self.resolve(element_type)
+            python_type = _python_type(element_type)
+            def encode_fixed_array(value, out):
+                _check_container(value, list)
+                if python_type is not None and not all_of_type(value, python_type):
+                    for index,element in enumerate(value):
+                        if type(element) is not python_type:
+                            try:
+                                _check_fixed(element_type, element)
+                            except errors.ValidationError as ve:
+                                raise ve.add_segment(index)
+                out += _LENGTH.pack(len(value))
+                try:
+                    out += struct.pack("<%d%s" % (len(value), fmt), *value)
+                except struct.error as exc:
+                    raise errors.ValidationError("Cannot encode array of %s: %s" % (element_type.name, exc))
+            return encode_fixed_array
+        encode_element = self.encoder(element_type)
+        def encode_array(value, out):
+            _check_container(value, list)
+            out += _LENGTH.pack(len(value))
+            for index,element in enumerate(value):
+                try:
+                    encode_element(element, out)
+                except errors.ValidationError as ve:
+                    raise ve.add_segment(index)
+        return encode_array
+
+    def struct_encoder(self, thetype):
+        steps = []
+        for group in self.fields(thetype):
+            if group[0] is not None:
+                packer, keys = struct.Struct("<" + "".join(group[0])), group[1]
+                checks = [(key, child, _python_type(child)) for key,child in zip(keys, group[2])]
+                checks = [check for check in checks if check[2] is not None]
+                steps.append((packer, keys, checks, None))
+            else:
+                steps.append((None, group[1], None, self.encoder(group[2])))
+        is_tuple = isinstance(thetype, core.TupleType)
+        num_children = len(thetype.child_types)
+        def encode_struct(value, out):
+            if is_tuple and (type(value) not in (list, tuple) or len(value) != num_children):
+                raise errors.ValidationError("Value needs to be a tuple with %d elements" % num_children)
+            if not is_tuple:
+                _check_container(value, dict)
+            for packer,keys,checks,encode_child in steps:
+                if packer is not None:
+                    try:
+                        values = [value[key] for key in keys]
+                    except KeyError as exc:
+                        raise errors.ValidationError("Field is missing", [exc.args[0]])
+                    for key,child,python_type in checks:
+                        if type(value[key]) is not python_type:
+                            try:
+                                _check_fixed(child, value[key])
+                            except errors.ValidationError as ve:
+                                raise ve.add_segment(key)
+                    try:
+                        out += packer.pack(*values)
+                    except struct.error as exc:
+                        raise errors.ValidationError("Cannot encode fields %s: %s" % (", ".join(map(str, keys)), exc))
+                else:
+                    try:
+                        child = value[keys]
+                    except KeyError:
+                        raise errors.ValidationError("Field is missing", [keys])
+                    try:
+                        encode_child(child, out)
+                    except errors.ValidationError as ve:
+                        raise ve.add_segment(keys)
+        return encode_struct
+
+    def make_decoder(self, thetype):
+        thetype = self.resolve(thetype)
+        fmt = FORMATS.get(thetype, None)
+        if fmt is not None:
+            unpacker = struct.Struct("<" + fmt)
+            size = unpacker.size
+            def decode_fixed(view, offset):
+                return _unpack_from(unpacker, view, offset)[0], offset + size
+            return decode_fixed
+        if thetype is defaults.String:
+            def decode_string(view, offset):
+                length, start = _read_length(view, offset)
+                end = start + length
+                _check_end(view, end, offset)
+                try:
+                    return str(view[start:end], "utf-8"), end
+                except UnicodeDecodeError as exc:
+                    raise errors.DecodeError("Invalid UTF-8 string: %s" % exc.reason, start + exc.start)
+            return decode_string
+        if isinstance(thetype, core.TypeApp) and thetype.root_type in (defaults.Array, defaults.List):
+            return self.array_decoder(thetype.param_values["T"])
+        if isinstance(thetype, core.TypeApp) and thetype.root_type is defaults.Map:
+            decode_key = self.decoder(thetype.param_values["K"])
+            decode_value = self.decoder(thetype.param_values["V"])
+            def decode_map(view, offset):
+                length, offset = _read_length(view, offset)
+                result = {}
+                for i in range(length):
+                    k, offset = decode_key(view, offset)
+                    result[k], offset = decode_value(view, offset)
+                return result, offset
+            return decode_map
+        if isinstance(thetype, (core.RecordType, core.TupleType)):
+            return self.struct_decoder(thetype)
+        if isinstance(thetype, core.UnionType):
+            branches = [(name, self.decoder(child)) for name,child in zip(thetype.child_names, thetype.child_types)]
+            def decode_union(view, offset):
+                index, start = _read_length(view, offset)
+                if index >= len(branches):
+                    raise errors.DecodeError("Invalid union branch %d" % index, offset)
+                name, decode_child = branches[index]
+                child, start = decode_child(view, start)
+                return {name: child}, start
+            return decode_union
+        raise errors.TCException("No binary encoding for %s" % repr(thetype))
+
+    def array_decoder(self, element_type):
+        fmt = self.fixed_format(element_type)
+        if fmt is not None:
+            size = struct.calcsize("<" + fmt)
+            if _can_cast(fmt):
+                def decode_array_view(view, offset):
+                    length, start = _read_length(view, offset)
+                    end = start + length * size
+                    _check_end(view, end, offset)
+                    return view[start:end].cast(fmt), end
+                return decode_array_view
+            def decode_fixed_array(view, offset):
+                length, start = _read_length(view, offset)
+                return list(_unpack_from(struct.Struct("<%d%s" % (length, fmt)), view, start)), start + length * size
+            return decode_fixed_array
+        decode_element = self.decoder(element_type)
+        def decode_array(view, offset):
+            length, offset = _read_length(view, offset)
+            result = []
+            for i in range(length):
+                element, offset = decode_element(view, offset)
+                result.append(element)
+            return result, offset
+        return decode_array
+
+    def struct_decoder(self, thetype):
+        steps = []
+        for group in self.fields(thetype):
+            if group[0] is not None:
+                unpacker = struct.Struct("<" + "".join(group[0]))
+                steps.append((unpacker, group[1], None))
+            else:
+                steps.append((None, group[1], self.decoder(group[2])))
+        if isinstance(thetype, core.TupleType):
+            def decode_tuple(view, offset):
+                result = []
+                for unpacker,keys,decode_child in steps:
+                    if unpacker is not None:
+                        result.extend(_unpack_from(unpacker, view, offset))
+                        offset += unpacker.size
+                    else:
+                        child, offset = decode_child(view, offset)
+                        result.append(child)
+                return tuple(result), offset
+            return decode_tuple
+        def decode_record(view, offset):
+            result = {}
+            for unpacker,keys,decode_child in steps:
+                if unpacker is not None:
+                    result.update(zip(keys, _unpack_from(unpacker, view, offset)))
+                    offset += unpacker.size
+                else:
+                    result[keys], offset = decode_child(view, offset)
+            return result, offset
+        return decode_record
+
+def encode(thetype, value):
+    """ Encodes a value of a type.  Use a Codec to encode many values. """
+    return Codec(thetype).encode(value)
+
+def decode(thetype, buffer, offset = 0):
+    """ Decodes a value of a type.  Use a Codec to decode many values. """
+    return Codec(thetype).decode(buffer, offset)
@@ -0,0 +1,94 @@
+
+# Columnar (struct of arrays) storage of arrays of fixed width records
+from typecube import core
+from typecube import defaults
+from typecube import checkers
+from typecube import codec
+from typecube import errors
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def _require_numpy():
+    if numpy is None:
+        raise errors.TCException("numpy is required for columnar storage")
+
+def _record_type(thetype):
+    """ Returns the record type of a record or of the elements of an array
+    or list of records. """
+    if isinstance(thetype, core.TypeApp) and thetype.root_type in (defaults.Array, defaults.List):
+        thetype = thetype.param_values.get("T")
+    if isinstance(thetype, core.TypeApp) and not isinstance(thetype.root_type, core.NativeType):
+        thetype = thetype.concrete
+    if not isinstance(thetype, core.RecordType) or thetype.args:
+        raise errors.TCException("%s is not a record (or array of records) without unbound args" % repr(thetype))
+    return thetype
+
+def record_dtype(thetype):
+    """ Returns the numpy structured dtype for a record type (or an array
+    of records) whose fields are all fixed width natives.  Fields use the
+    same (little endian) formats as the binary codec. """
+    _require_numpy()
+    record_type = _record_type(thetype)
+    fields = []
+    for name,child in zip(record_type.child_names, record_type.child_types):
+        fmt = codec.FORMATS.get(child, None)
+        if fmt is None:
+            raise errors.TCException("Field '%s' of %s is not a fixed width native" % (name, record_type.name))
+        fields.append((name, "<" + fmt))
+    return numpy.dtype(fields)
+
+class ColumnarArray(object):
+    """ An array of records of a fixed width record type stored as a numpy
+    structured array, ie as contiguous columns of fixed width values
+    rather than as a list of dicts.
+
+    Since the dtype of the array enforces the type of every field,
+    validating a columnar array only checks its dtype and shape.
+    """
+    def __init__(self, thetype, array):
+        self.record_type = _record_type(thetype)
+        self.dtype = record_dtype(self.record_type)
+        self.array = array
+        self.validate()
+
+    @classmethod
+    def from_records(cls, thetype, records, validate = True):
+        """ Converts a list of dicts into a columnar array.  The records are
+        validated against the record type first unless validate is False
+        (numpy would otherwise silently convert values such as "1"). """
+        record_type = _record_type(thetype)
+        dtype = record_dtype(record_type)
+        if validate:
+            checkers.type_check_many(record_type, records)
+        array = numpy.empty(len(records), dtype = dtype)
+        for name in record_type.child_names:
+            array[name] = [record[name] for record in records]
+        return cls(record_type, array)
+
+    def to_records(self):
+        """ Returns the records as a list of dicts of python values. """
+        names = self.record_type.child_names
+        return [dict(zip(names, values)) for values in self.array.tolist()]
+
+    def validate(self):
+        """ Checks that the array is a one dimensional array of the dtype of
+        the record type and returns it. """
+        if not isinstance(self.array, numpy.ndarray):
+            raise errors.ValidationError("%s needs to be a numpy array" % str(type(self.array)))
+        if self.array.dtype != self.dtype:
+            raise errors.ValidationError("Array needs dtype %s, found %s" % (self.dtype, self.array.dtype))
+        if self.array.ndim != 1:
+            raise errors.ValidationError("Array needs 1 dimension, found %d" % self.array.ndim)
+        return self
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        """ Returns a column by name or a record (as a dict) by index. """
+        if isinstance(key, str):
+            return self.array[key]
+        return dict(zip(self.record_type.child_names, self.array[key].tolist()))
@@ -0,0 +1,134 @@
+
+# Checks of the arguments and results of python functions against function types
+import time
+import inspect
+import functools
+import threading
+from typecube import core
+from typecube import checkers
+from typecube import errors
+
+class ContractStats(object):
+    """ Counters of the contract checks of a function.  Checks that fail
+    are counted (and timed) as checked too. """
+    __slots__ = ("calls", "checked", "failures", "check_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.checked = 0
+        self.failures = 0
+        self.check_time = 0.0
+
+    @property
+    def skipped(self):
+        return self.calls - self.checked
+
+    @property
+    def overhead(self):
+        """ The average time spent checking per call. """
+        return self.check_time / self.calls if self.calls else 0.0
+
+class _Sampler(object):
+    """ Decides which calls are checked: every sample_every'th call, and
+    only while less than budget seconds were spent checking in the current
+    second (if a budget is given).  The stats of the checks are updated
+    under the same lock. """
+    def __init__(self, sample_every, budget, stats):
+        self.sample_every = sample_every
+        self.budget = budget
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.countdown = 1
+        self.window = 0
+        self.spent = 0.0
+
+    def should_check(self):
+        with self.lock:
+            self.stats.calls += 1
+            self.countdown -= 1
+            if self.countdown > 0: return False
+            self.countdown = self.sample_every
+            if self.budget is not None:
+                window = int(time.monotonic())
+                if window != self.window:
+                    self.window, self.spent = window, 0.0
+                if self.spent >= self.budget: return False
+            return True
+
+    def record(self, elapsed, failed):
+        with self.lock:
+            self.stats.checked += 1
+            self.stats.check_time += elapsed
+            if failed: self.stats.failures += 1
+            self.spent += elapsed
+
+def contract(functype, sample_every = 1, budget = None):
+    """ Returns a decorator that checks the arguments and the result of a
+    function against a FunctionType.
+
+    Inputs of the function type are matched to the parameters of the
+    function by name, or by position if they are not named.  A
+    ValidationError is raised (with the name of the parameter, or the name
+    of the output or "return", as the first segment of its path) if a value
+    does not conform.
+
+    To keep contracts on in production only a sample of the calls can be
+    checked: every sample_every'th call and/or only until budget seconds
+    were spent checking in each second.  The counters of the checks are
+    available as the contract_stats attribute of the decorated function.
+
+        @contract(FunctionType("area").add(Rect, "rect").set_output(Double), sample_every = 100)
+        def area(rect): ...
+    """
+    if not isinstance(functype, core.FunctionType):
+        raise errors.TCException("Contracts need a FunctionType, found %s" % repr(functype))
+    def decorator(function):
+        signature = inspect.signature(function)
+        params = list(signature.parameters)
+        inputs = []
+        for index,(input_type,input_name) in enumerate(zip(functype.input_types, functype.input_names)):
+            if input_name is None:
+                if index >= len(params):
+                    raise errors.TCException("%s has no parameter %d" % (function.__name__, index))
+                input_name = params[index]
+            elif input_name not in signature.parameters:
+                raise errors.TCException("%s has no parameter '%s'" % (function.__name__, input_name))
+            inputs.append((input_name, input_type))
+        output_type, output_name = functype.output_type, functype.output_name or "return"
+        sampler = _Sampler(sample_every, budget, ContractStats())
+
+        def check(thetype, value, name):
+            try:
+                checkers.compiled(thetype)(value)
+            except errors.ValidationError as ve:
+                raise ve.add_segment(name)
+
+        @functools.wraps(function)
+        def checked_function(*args, **kwargs):
+            if not sampler.should_check():
+                return function(*args, **kwargs)
+            # start is None while the function itself runs so neither its
+            # time nor its own ValidationErrors are counted
+            elapsed, failed = 0.0, False
+            start = time.perf_counter()
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                for name,input_type in inputs:
+                    check(input_type, bound.arguments[name], name)
+                elapsed, start = time.perf_counter() - start, None
+                result = function(*args, **kwargs)
+                if output_type is not None:
+                    start = time.perf_counter()
+                    check(output_type, result, output_name)
+            except errors.ValidationError:
+                failed = start is not None
+                raise
+            finally:
+                if start is not None:
+                    elapsed += time.perf_counter() - start
+                sampler.record(elapsed, failed)
+            return result
+        checked_function.contract_stats = sampler.stats
+        return checked_function
+    return decorator
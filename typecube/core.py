@@ -1,3 +1,7 @@
+import weakref
+from sys import intern
+from types import MappingProxyType
+
 
 class Namespace(object):
     def __init__(self, name, parent = None):
@@ -6,11 +10,68 @@ class Namespace(object):
         self.children = {}
         self.types = {}
 
+    @property
+    def fqn(self):
+        if self.parent is None or not self.parent.name:
+            return self.name
+        return self.parent.fqn + "." + self.name
+
+    def ensure(self, path):
+        """ Returns the namespace at a dotted path relative to this one,
+        creating any that do not exist.  Names are interned so lookups
+        through namespaces compare them by identity. """
+        namespace = self
+        for name in path.split("."):
+            name = intern(name)
+            child = namespace.children.get(name, None)
+            if child is None:
+                child = namespace.children[name] = Namespace(name, namespace)
+            namespace = child
+        return namespace
+
+    def add_type(self, name, thetype):
+        if name in self.types:
+            assert False, "Type '%s' already exists in namespace '%s'" % (name, self.fqn)
+        self.types[name] = thetype
+        return self
+
+    def find_type(self, fqn):
+        """ Returns the type at a dotted path relative to this namespace or
+        None if it does not exist. """
+        namespace = self
+        parts = fqn.split(".")
+        for name in parts[:-1]:
+            namespace = namespace.children.get(name, None)
+            if namespace is None: return None
+        return namespace.types.get(parts[-1], None)
+
+# Bumped whenever the validator of a type is replaced so anything derived
+# from validators (eg cached validation results) can be dropped
+validator_generation = 0
+
+# Bumped whenever children are added to a type so anything derived from the
+# structure of types (eg memoized comparisons) can be dropped
+structure_generation = 0
+
 class Type(object):
+    __slots__ = ("name", "args", "validator", "_applications", "__weakref__")
+
     def __init__(self, name, args = None):
         self.name = name
         self.args = args or []
         self.validator = None
+        self._applications = weakref.WeakValueDictionary()
+
+    def __getstate__(self):
+        # Applications are interned again as they are unpickled
+        state = _slot_values(self)
+        state.pop("_applications", None)
+        return state
+
+    def __setstate__(self, state):
+        for name,value in state.items():
+            object.__setattr__(self, name, value)
+        _applications_of(self)
 
     def set_name(self, name):
         self.name = name
@@ -26,7 +87,9 @@ class Type(object):
         return out
 
     def set_validator(self, validator):
+        global validator_generation
         self.validator = validator
+        validator_generation += 1
         return self
 
     def __getitem__(self, type_vals):
@@ -40,25 +103,128 @@ class Type(object):
     def apply(self, **param_values):
         return TypeApp(self, **param_values)
 
+def _applications_of(thetype):
+    """ Returns the interned applications of a type.  The type may still be
+    being unpickled in which case its applications are not yet set. """
+    try:
+        return thetype._applications
+    except AttributeError:
+        applications = weakref.WeakValueDictionary()
+        object.__setattr__(thetype, "_applications", applications)
+        return applications
+
+def _size_of(thetype):
+    """ Returns the number of children of a type (which only ever grows). """
+    if isinstance(thetype, DataType):
+        return len(thetype.child_types)
+    if isinstance(thetype, FunctionType):
+        return len(thetype.input_types) + (thetype.output_type is not None)
+    return 0
+
+def _slots_of(cls):
+    """ Returns the names of all the (instance) slots of a class. """
+    return [name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ())
+                 if name != "__weakref__"]
+
+def _slot_values(thetype):
+    """ Returns the values of the slots of a type that are set. """
+    state = {}
+    for name in _slots_of(thetype.__class__):
+        try:
+            state[name] = getattr(thetype, name)
+        except AttributeError:
+            pass
+    return state
+
+def _type_app(target_type, param_values, validator = None):
+    """ Unpickles a type application by interning it again. """
+    app = TypeApp(target_type, **param_values)
+    app.validator = validator
+    return app
+
 class TypeVar(Type):
     """ A type variable.  """
+    __slots__ = ()
+
     def __init__(self, name, args = None):
         assert name is not None and name.strip(), "Type vars MUST have names"
         Type.__init__(self, name, args)
 
 class TypeApp(Type):
-    """ Type applications allow generics to be concretized. """
-    def __init__(self, target_type, **param_values):
-        Type.__init__(self, target_type.name)
-        self.param_values = param_values
-        self.root_type = target_type
+    """ Type applications allow generics to be concretized.
+
+    Applications are interned so applying the same type to the same
+    parameter values always returns the same (immutable) instance.  Type
+    applications can therefore be compared and hashed by identity and used as
+    keys in caches.  Note that this also means validators set on an
+    application apply wherever the same application is used.
+
+    Applications are only interned while they are in use (they are held
+    weakly by their root types) so applying types on the fly does not grow
+    memory.  A validator set on an application that is no longer referred
+    to is therefore lost along with the application.
+
+    The args of an application are the args of the root type that have not
+    been bound yet so that these can be applied later on.
+    """
+    __slots__ = ("root_type", "param_values", "_concrete")
+
+    def __new__(cls, target_type, **param_values):
         if isinstance(target_type, TypeApp):
-            self.root_type = target_type.root_type
-            self.param_values.update(target_type.param_values)
-            # now only update *new* values that have not been duplicated
-            for k,v in param_values.iteritems():
+            # Only bind values of args that are still unbound
+            values = dict(target_type.param_values)
+            for k,v in param_values.items():
                 if k in target_type.args:
-                    self.param_values[k] = v
+                    values[k] = v
+            target_type, param_values = target_type.root_type, values
+        applications = _applications_of(target_type)
+        key = frozenset(param_values.items())
+        app = applications.get(key, None)
+        if app is None:
+            app = Type.__new__(cls)
+            Type.__init__(app, target_type.name, tuple(arg for arg in target_type.args if arg not in param_values))
+            app.root_type = target_type
+            app.param_values = MappingProxyType(param_values)
+            app = applications.setdefault(key, app)
+        return app
+
+    def __init__(self, target_type, **param_values):
+        # Everything is setup when the application is interned in __new__
+        pass
+
+    def __reduce__(self):
+        return (_type_app, (self.root_type, dict(self.param_values), self.validator))
+
+    @property
+    def concrete(self):
+        """ The root type with all type variables of the application replaced
+        by the values they are bound to.  This is computed once and cached
+        until children are added to the root type (changes to types nested
+        within the root type are not tracked).
+
+        Native types cannot be expanded so an application of a native type
+        is its own concrete type.
+        """
+        size = _size_of(self.root_type)
+        cached = getattr(self, "_concrete", None)
+        concrete = cached[1] if cached is not None and cached[0] == size else None
+        if concrete is None:
+            if isinstance(self.root_type, NativeType):
+                concrete = self
+            else:
+                concrete = substitute(self.root_type, self.param_values)
+                if list(concrete.args) != list(self.args):
+                    # Args bound by the application are no longer args of
+                    # the concrete type
+                    if concrete is self.root_type:
+                        concrete = _copy_type(self.root_type, args = list(self.args))
+                    else:
+                        object.__setattr__(concrete, "args", tuple(self.args) if isinstance(concrete, Frozen) else list(self.args))
+            self._concrete = (size, concrete)
+        return concrete
+
+    def apply(self, **param_values):
+        return TypeApp(self, **param_values)
 
 class NativeType(Type):
     """ A native type whose details are not known but cannot be 
@@ -66,6 +232,8 @@ class NativeType(Type):
 
     eg Array<T>, Map<K,V> etc
     """
+    __slots__ = ("mapper_functor",)
+
     def __init__(self, name, args = None):
         Type.__init__(self, name, args)
         self.mapper_functor = None
@@ -76,16 +244,22 @@ class ContainerType(Type):
         Product types (Records, Tuples, Named tuples etc) and 
         Sum types (Eg Unions, Enums (Tagged Unions), Algebraic Data Types.
     """
+    __slots__ = ()
+
     def name_exists(self, name):
         pass
 
     def add(self, child_type, child_name = None):
+        global structure_generation
         if child_name and self.name_exists(child_name):
             assert False, "Type '%s' already taken" % child_name
         self._add_type(child_type, child_name)
+        structure_generation += 1
         return self
 
 class FunctionType(ContainerType):
+    __slots__ = ("input_types", "input_names", "output_type", "output_name")
+
     def __init__(self, name, args = None):
         Type.__init__(self, name, args)
         self.input_types = []
@@ -96,25 +270,374 @@ class FunctionType(ContainerType):
     def name_exists(self, name):
         return name == self.output_name or name in self.input_names
 
+    def set_output(self, output_type, output_name = None):
+        global structure_generation
+        if output_name and output_name in self.input_names:
+            assert False, "Type '%s' already taken" % output_name
+        self.output_type = output_type
+        self.output_name = output_name
+        structure_generation += 1
+        return self
+
     def _add_type(self, input_type, input_name):
         self.input_types.append(input_type)
         self.input_names.append(input_name)
 
 class DataType(ContainerType):
+    __slots__ = ("child_types", "child_names", "child_indexes")
+
     def __init__(self, name, args = None):
         ContainerType.__init__(self, name, args)
         self.child_types = []
         self.child_names = []
+        # Index of each named child so children can be found in one lookup
+        self.child_indexes = {}
 
     def name_exists(self, name):
-        return name in self.child_names
+        return name in self.child_indexes
 
     def _add_type(self, child_type, child_name):
+        if child_name is not None:
+            self.child_indexes[child_name] = len(self.child_types)
         self.child_types.append(child_type)
         self.child_names.append(child_name)
 
-class RecordType(DataType): pass
+class RecordType(DataType):
+    __slots__ = ()
+
+class TupleType(DataType):
+    __slots__ = ()
+
+class UnionType(DataType):
+    __slots__ = ()
+
+def _copy_type(thetype, **changes):
+    """ Returns a shallow copy of a type (with the given slots changed) that
+    does not share any of its applications.  Children of copies of frozen
+    types are kept as tuples. """
+    copy = thetype.__class__.__new__(thetype.__class__)
+    state = _slot_values(thetype)
+    state.pop("_concrete", None)
+    state["_applications"] = weakref.WeakValueDictionary()
+    for name,value in changes.items():
+        if type(value) is list and isinstance(thetype, Frozen):
+            value = tuple(value)
+        state[name] = value
+    copy.__setstate__(state)
+    return copy
+
+def substitute(thetype, param_values):
+    """ Returns a version of a type where all type variables are replaced
+    with the types they are bound to in param_values.
+
+    Only the parts of the type graph that refer to bound type variables are
+    copied, the rest are shared with the original type.  Applications
+    within the type have their values substituted (and are interned again)
+    but are not expanded further as that happens lazily when their concrete
+    type is needed.  This keeps substitution finite for recursive generic
+    types.
+    """
+    return _substitute(thetype, param_values, {}, False)
+
+def _substitute(thetype, param_values, memo, nested):
+    if id(thetype) in memo: return memo[id(thetype)]
+    memo[id(thetype)] = thetype
+
+    result = thetype
+    if isinstance(thetype, TypeVar):
+        result = param_values.get(thetype.name, thetype)
+    elif isinstance(thetype, TypeApp):
+        values = dict((k, _substitute(v, param_values, memo, True)) for k,v in thetype.param_values.items())
+        if any(values[k] is not v for k,v in thetype.param_values.items()):
+            result = thetype.root_type.apply(**values)
+    elif isinstance(thetype, (DataType, FunctionType)):
+        # Args of nested generic types shadow the values being substituted
+        if nested and thetype.args:
+            param_values = dict((k,v) for k,v in param_values.items() if k not in thetype.args)
+        if isinstance(thetype, DataType):
+            child_types = [_substitute(child, param_values, memo, True) for child in thetype.child_types]
+            if any(a is not b for a,b in zip(child_types, thetype.child_types)):
+                result = _copy_type(thetype, child_types = child_types,
+                                    child_names = list(thetype.child_names),
+                                    child_indexes = dict(thetype.child_indexes))
+        else:
+            input_types = [_substitute(child, param_values, memo, True) for child in thetype.input_types]
+            output_type = thetype.output_type
+            if output_type is not None:
+                output_type = _substitute(output_type, param_values, memo, True)
+            if output_type is not thetype.output_type or \
+                    any(a is not b for a,b in zip(input_types, thetype.input_types)):
+                result = _copy_type(thetype, input_types = input_types,
+                                    input_names = list(thetype.input_names),
+                                    output_type = output_type)
+    memo[id(thetype)] = result
+    return result
+
+class Frozen(object):
+    """ Base of the immutable versions of types created by freeze.  Frozen
+    types keep their children in tuples and cannot be changed (though they
+    can still be applied to type args). """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Cannot set '%s' of frozen type '%s'" % (name, self.name))
+
+    def _add_type(self, child_type, child_name):
+        raise AttributeError("Cannot add to frozen type '%s'" % self.name)
+
+class FrozenRecordType(Frozen, RecordType):
+    __slots__ = ()
+
+class FrozenTupleType(Frozen, TupleType):
+    __slots__ = ()
+
+class FrozenUnionType(Frozen, UnionType):
+    __slots__ = ()
+
+class FrozenFunctionType(Frozen, FunctionType):
+    __slots__ = ()
+
+_FROZEN_CLASSES = {
+    RecordType: FrozenRecordType,
+    TupleType: FrozenTupleType,
+    UnionType: FrozenUnionType,
+    FunctionType: FrozenFunctionType,
+}
+
+def freeze(thetype, memo = None):
+    """ Returns an immutable copy of a type and all the types it refers to.
+
+    Records, tuples, unions and function types are copied into frozen
+    versions of their classes (which are still instances of the original
+    classes) that hold their children in tuples.  Applications are applied
+    again to the frozen types.  Natives and type variables are shared as
+    they are.  Types are only frozen once per memo so a memo (a dict) can be
+    shared to freeze a whole set of types (see freeze_namespace).
+    """
+    if memo is None: memo = {}
+    key = id(thetype)
+    if key in memo: return memo[key]
+    if isinstance(thetype, TypeApp):
+        memo[key] = thetype
+        values = dict((k, freeze(v, memo)) for k,v in thetype.param_values.items())
+        root_type = freeze(thetype.root_type, memo)
+        if root_type is not thetype.root_type or any(values[k] is not v for k,v in thetype.param_values.items()):
+            frozen = TypeApp(root_type, **values)
+            if thetype.validator is not None:
+                frozen.validator = thetype.validator
+            memo[key] = frozen
+        return memo[key]
+    frozen_class = _FROZEN_CLASSES.get(thetype.__class__, None)
+    if frozen_class is None:
+        # Natives, type vars, already frozen types etc
+        return thetype
+
+    frozen = frozen_class.__new__(frozen_class)
+    memo[key] = frozen
+    state = _slot_values(thetype)
+    state["_applications"] = weakref.WeakValueDictionary()
+    state["args"] = tuple(thetype.args)
+    if isinstance(thetype, DataType):
+        state["child_types"] = tuple(freeze(child, memo) for child in thetype.child_types)
+        state["child_names"] = tuple(thetype.child_names)
+        state["child_indexes"] = dict(thetype.child_indexes)
+    else:
+        state["input_types"] = tuple(freeze(child, memo) for child in thetype.input_types)
+        state["input_names"] = tuple(thetype.input_names)
+        if thetype.output_type is not None:
+            state["output_type"] = freeze(thetype.output_type, memo)
+    frozen.__setstate__(state)
+    return frozen
+
+def freeze_namespace(namespace, parent = None, memo = None):
+    """ Returns a copy of a tree of namespaces with all their types frozen. """
+    if memo is None: memo = {}
+    result = Namespace(namespace.name, parent)
+    for name,thetype in namespace.types.items():
+        result.types[name] = freeze(thetype, memo)
+    for name,child in namespace.children.items():
+        result.children[name] = freeze_namespace(child, result, memo)
+    return result
+
+EQUAL = "equal"
+SUBTYPE = "subtype"
+ASSIGNABLE = "assignable"
+
+class _Relations(object):
+    """ Memoized results of comparing pairs of types.  Results are held
+    weakly (by both types) and dropped whenever any type changes. """
+    def __init__(self):
+        self.generation = None
+        self.results = {}
+
+    def table(self, relation):
+        generation = (structure_generation, validator_generation)
+        if generation != self.generation:
+            self.generation = generation
+            self.results = {}
+        table = self.results.get(relation, None)
+        if table is None:
+            table = self.results[relation] = weakref.WeakKeyDictionary()
+        return table
+
+    def get(self, relation, a, b):
+        results = self.table(relation).get(a, None)
+        return None if results is None else results.get(b, None)
+
+    def set(self, relation, a, b, result):
+        table = self.table(relation)
+        results = table.get(a, None)
+        if results is None:
+            results = table[a] = weakref.WeakKeyDictionary()
+        results[b] = result
+
+_relations = _Relations()
+
+def structurally_equal(a, b):
+    """ Returns whether two types have the same structure: records, tuples,
+    unions and function types with the same (named) children in the same
+    order, the same natives, applications of the same natives to equal
+    types and the same validators.  Names of the types themselves are not
+    compared and applications of non natives are compared by their concrete
+    types.  Recursive types are equal if their structures are equal when
+    unrolled. """
+    return _relate_memoized(a, b, EQUAL)
+
+def is_subtype(a, b):
+    """ Returns whether type a is a structural subtype of type b, ie
+    whether every value of a is a value of b by their structures:
+
+        * records with all the fields of b (and maybe more) whose types are
+          subtypes of those of b (width and depth subtyping)
+        * tuples of the same length with subtypes as elements
+        * anything that is a subtype of a branch of a union b (whatever
+          the name of the branch), so unions are subtypes of b if all their
+          branches are
+        * functions with supertypes as inputs and a subtype as output
+        * applications of the same native with subtypes as values
+        * the same natives
+
+    If b has a validator a must have the same validator.
+    """
+    return _relate_memoized(a, b, SUBTYPE)
+
+def is_assignable(a, b):
+    """ Returns whether any value validated as type a is valid as type b.
+    This is is_subtype but natives without args are also assignable to
+    natives with the same validator (or without a validator), eg an Int is
+    assignable to a Long. """
+    return _relate_memoized(a, b, ASSIGNABLE)
+
+def _relate_memoized(a, b, relation):
+    if a is b: return True
+    result = _relations.get(relation, a, b)
+    if result is None:
+        related = []
+        result = _relate(a, b, relation, set(), related)
+        if result:
+            # Everything assumed to be related on the way was confirmed
+            for x,y in related:
+                _relations.set(relation, x, y, True)
+        _relations.set(relation, a, b, result)
+    return result
+
+def _resolved(thetype):
+    if isinstance(thetype, TypeApp) and not isinstance(thetype.root_type, NativeType):
+        return thetype.concrete
+    return thetype
+
+def _relate(a, b, relation, assumed, related):
+    """ Relates two types coinductively: pairs that are already being
+    related further up are assumed to be related. """
+    if a is b: return True
+    a, b = _resolved(a), _resolved(b)
+    if a is b: return True
+    key = (id(a), id(b))
+    if key in assumed: return True
+    assumed.add(key)
+    marker = len(related)
+    result = _relate_types(a, b, relation, assumed, related)
+    if result:
+        related.append((a, b))
+    else:
+        # What was related by assuming these were related does not hold
+        # (this matters when trying alternatives, eg branches of unions)
+        assumed.discard(key)
+        del related[marker:]
+    return result
+
+def _relate_types(a, b, relation, assumed, related):
+    relate = lambda x, y: _relate(x, y, relation, assumed, related)
+    if a.validator is not b.validator:
+        if relation == EQUAL or b.validator is not None: return False
+    if relation == EQUAL and list(a.args) != list(b.args):
+        return False
+    if relation != EQUAL and (isinstance(a, UnionType) or isinstance(b, UnionType)):
+        # Values of unions are values of any of their branches
+        if isinstance(a, UnionType):
+            return all(relate(child, b) for child in a.child_types)
+        return any(relate(a, child) for child in b.child_types)
+    if isinstance(a, TypeVar) or isinstance(b, TypeVar):
+        return isinstance(a, TypeVar) and isinstance(b, TypeVar) and a.name == b.name
+    if isinstance(a, TypeApp) or isinstance(b, TypeApp):
+        if not (isinstance(a, TypeApp) and isinstance(b, TypeApp)): return False
+        if a.root_type is not b.root_type or set(a.param_values) != set(b.param_values): return False
+        return all(relate(v, b.param_values[k]) for k,v in a.param_values.items())
+    if isinstance(a, NativeType) or isinstance(b, NativeType):
+        # Different natives are only assignable through their validators
+        return relation == ASSIGNABLE and isinstance(a, NativeType) and isinstance(b, NativeType) and \
+                not a.args and not b.args and not a.mapper_functor and not b.mapper_functor
+    if isinstance(a, FunctionType) or isinstance(b, FunctionType):
+        if not (isinstance(a, FunctionType) and isinstance(b, FunctionType)): return False
+        if list(a.input_names) != list(b.input_names) or (a.output_type is None) != (b.output_type is None):
+            return False
+        if relation == EQUAL:
+            inputs = all(relate(x, y) for x,y in zip(a.input_types, b.input_types))
+        else:
+            inputs = all(relate(y, x) for x,y in zip(a.input_types, b.input_types))
+        return inputs and (a.output_type is None or relate(a.output_type, b.output_type))
+    for kind in (RecordType, TupleType, UnionType):
+        if isinstance(a, kind) != isinstance(b, kind): return False
+    if isinstance(a, TupleType) or relation == EQUAL:
+        if list(a.child_names) != list(b.child_names): return False
+        return all(relate(x, y) for x,y in zip(a.child_types, b.child_types))
+    # Width subtyping of records: a may have more fields than b
+    for name,child in zip(b.child_names, b.child_types):
+        if name not in a.child_indexes: return False
+        if not relate(a.child_types[a.child_indexes[name]], child): return False
+    return True
+
+# Depth up to which types are unrolled when hashing them
+HASH_DEPTH = 4
+
+_hashes = weakref.WeakKeyDictionary()
 
-class TupleType(DataType): pass
+def structural_hash(thetype):
+    """ Returns a hash of the structure of a type that is the same for types
+    that are structurally_equal.  Types are only hashed up to a depth of
+    HASH_DEPTH so recursive types can be hashed. """
+    generation = (structure_generation, validator_generation)
+    cached = _hashes.get(thetype, None)
+    if cached is None or cached[0] != generation:
+        cached = _hashes[thetype] = (generation, _hash(thetype, HASH_DEPTH))
+    return cached[1]
 
-class UnionType(DataType): pass
+def _hash(thetype, depth):
+    thetype = _resolved(thetype)
+    kind = thetype.__class__.__name__.replace("Frozen", "")
+    if depth == 0:
+        return hash(kind)
+    validator = id(thetype.validator) if thetype.validator is not None else None
+    if isinstance(thetype, TypeVar):
+        return hash((kind, thetype.name))
+    if isinstance(thetype, TypeApp):
+        values = tuple(sorted((k, _hash(v, depth - 1)) for k,v in thetype.param_values.items()))
+        return hash((kind, id(thetype.root_type), values, validator))
+    if isinstance(thetype, NativeType):
+        return hash((kind, id(thetype)))
+    if isinstance(thetype, FunctionType):
+        children = tuple(_hash(child, depth - 1) for child in thetype.input_types)
+        output = None if thetype.output_type is None else _hash(thetype.output_type, depth - 1)
+        return hash((kind, tuple(thetype.input_names), children, output, tuple(thetype.args), validator))
+    children = tuple(_hash(child, depth - 1) for child in thetype.child_types)
+    return hash((kind, tuple(thetype.child_names), children, tuple(thetype.args), validator))
@@ -1,6 +1,7 @@
 
 from typecube.core import *
 from typecube import errors
+from typecube.utils import all_of_type
 
 def default_string_validator(thetype, val, bindings = None):
     if type(val) is not str:
@@ -17,18 +18,36 @@ def default_float_validator(thetype, val, bindings = None):
         raise errors.ValidationError("%s needs to be a float, found %s" % (str(val), str(type(val))))
     return val
 
+# Validators that accept a value if and only if it is of exactly one python
+# type declare it so that containers of them can be checked in bulk.
+default_string_validator.python_type = str
+default_int_validator.python_type = int
+default_float_validator.python_type = float
+
 def default_array_mapper_functor(function, val):
     if type(val) is not list:
         raise errors.ValidationError("%s needs to be a list, found %s" % (str(val), str(type(val))))
+    python_types = getattr(function, "python_types", None)
+    if python_types and python_types[0] is not None:
+        if all_of_type(val, python_types[0]): return val
+    # Only fall back to the per element checks to find the offending values
     for v in val: function(v)
     return val
 
 def default_dict_mapper_functor(function, val):
     if type(val) is not dict:
         raise errors.ValidationError("%s needs to be a dict, found %s" % (str(val), str(type(val))))
+    python_types = getattr(function, "python_types", None)
+    if python_types and None not in python_types:
+        key_type, value_type = python_types
+        if all_of_type(val, key_type) and all_of_type(val.values(), value_type): return val
     for k,v in iter(val.items()): function(k,v)
     return val
 
+# Mapper functors declare the python type of the containers they accept
+default_array_mapper_functor.python_type = list
+default_dict_mapper_functor.python_type = dict
+
 Byte = NativeType("byte")
 Char = NativeType("char")
 Float = NativeType("float").set_validator(default_float_validator)
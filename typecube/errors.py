@@ -5,7 +5,94 @@ class TCException(Exception):
     def __init__(self, msg):
         Exception.__init__(self, msg)
 
-class ValidationError(TCException): pass
+class ValidationError(TCException):
+    """ Raised when a value does not conform to a type.
+
+    The path to the offending value (a list of field names, indexes and
+    keys) is only built as the error propagates up through the containers
+    it was found in, so tracking it costs nothing while values are valid.
+    """
+    def __init__(self, msg, path = None):
+        TCException.__init__(self, msg)
+        self.msg = msg
+        # Segments are added innermost first as the error propagates
+        self._segments = list(reversed(path)) if path else []
+
+    def __reduce__(self):
+        return (self.__class__, (self.msg, self.path))
+
+    def __str__(self):
+        location = self.location
+        if not location: return self.msg
+        return "%s: %s" % (location, self.msg)
+
+    def add_segment(self, segment):
+        """ Adds the segment of the path that leads to this error within an
+        enclosing value. """
+        self._segments.append(segment)
+        return self
+
+    @property
+    def path(self):
+        return list(reversed(self._segments))
+
+    @property
+    def location(self):
+        """ The path to the offending value, eg orders[17].items[3].price """
+        out = ""
+        for segment in reversed(self._segments):
+            if type(segment) is int:
+                out += "[%d]" % segment
+            elif type(segment) is str and segment.isidentifier():
+                out += "." + segment if out else segment
+            else:
+                out += "[%r]" % (segment,)
+        return out
+
+class ValidationErrors(ValidationError):
+    """ All the errors found in a value when validation does not stop at the
+    first error. """
+    def __init__(self, errors):
+        self.errors = []
+        for error in errors:
+            if isinstance(error, ValidationErrors):
+                self.errors.extend(error.errors)
+            else:
+                self.errors.append(error)
+        ValidationError.__init__(self, "%d validation errors" % len(self.errors))
+
+    def __reduce__(self):
+        return (self.__class__, (self.errors,))
+
+    def __str__(self):
+        return "\n".join(map(str, self.errors))
+
+    def add_segment(self, segment):
+        for error in self.errors:
+            error.add_segment(segment)
+        return self
+
+class StreamValidationError(ValidationError):
+    def __init__(self, msg, path, offset):
+        ValidationError.__init__(self, msg, path)
+        self.offset = offset
+
+    def __reduce__(self):
+        return (self.__class__, (self.msg, self.path, self.offset))
+
+    def __str__(self):
+        return "%s (at byte offset %d)" % (ValidationError.__str__(self), self.offset)
+
+class ParseError(TCException):
+    def __init__(self, msg, line, column):
+        TCException.__init__(self, "Line %d, Column %d: %s" % (line, column, msg))
+        self.line = line
+        self.column = column
+
+class DecodeError(TCException):
+    def __init__(self, msg, offset):
+        TCException.__init__(self, "Byte offset %d: %s" % (offset, msg))
+        self.offset = offset
 
 class FieldNotFoundException(TCException):
     def __init__(self, field_name, parent_type):
@@ -0,0 +1,329 @@
+
+# Revalidation of values that were changed after they were validated
+from typecube import core
+from typecube import defaults
+from typecube import checkers
+from typecube import errors
+
+REMOVE = "remove"
+REPLACE = "replace"
+
+def revalidate(thetype, value, changes, fail_fast = True):
+    """ Validates a value that was valid before the given changes were made
+    to it by only validating the parts that changed.
+
+    Each change is either a path (a list of field names, indexes and keys
+    from the root of the value), a JSON Patch operation (a dict with an
+    "op" and a "path" that is a JSON pointer or a list) or a change recorded
+    by a Tracker.  For each change the value at the path is validated
+    against its type and the validators of the types enclosing it are run
+    again.  When a value is removed its parent is validated instead (except
+    for elements of arrays and maps which never need to be there).  Changes
+    within values that are themselves changed are skipped.
+
+    Raises a ValidationError with the path to the first offending value or
+    if fail_fast is False, a ValidationErrors with all errors.
+    """
+    targets = {}
+    for change in changes:
+        for op,path in _normalize(change):
+            if op == REMOVE:
+                path = path[:-1] + (None,)
+            # Changes to the same paths only need to be validated once
+            if path not in targets or op != REMOVE:
+                targets[path] = op
+    validated = set()
+    failures = []
+    for path in sorted(targets, key = len):
+        if any(path[:index] in validated for index in range(len(path) + 1)):
+            continue
+        try:
+            _revalidate_path(thetype, value, path, validated)
+        except errors.ValidationError as ve:
+            if fail_fast: raise
+            failures.append(ve)
+    if failures: raise errors.ValidationErrors(failures)
+
+def _normalize(change):
+    """ Returns the (op, path) of the changes described by a change. """
+    if not isinstance(change, dict):
+        return [(REPLACE, tuple(change))]
+    op = change.get("op", REPLACE)
+    if op == "test":
+        return []
+    changes = [(REMOVE if op == REMOVE else REPLACE, _path(change["path"]))]
+    if op == "move":
+        changes.append((REMOVE, _path(change["from"])))
+    return changes
+
+def _path(path):
+    return tuple(parse_pointer(path) if isinstance(path, str) else path)
+
+def parse_pointer(pointer):
+    """ Returns the segments of a JSON pointer, eg /a/b~1c/0 -> ["a", "b/c", "0"] """
+    if not pointer: return []
+    if not pointer.startswith("/"):
+        raise errors.TCException("Invalid JSON pointer '%s'" % pointer)
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+def _revalidate_path(thetype, value, path, validated):
+    """ Walks a value and its type along a path and validates the value at
+    the end of it and then the validators of the values on the way back.
+    A path ending with None means an element was removed from the
+    container it leads to. """
+    ancestors = []
+    for depth,segment in enumerate(path):
+        if segment is None:
+            # Removing elements cannot make arrays and maps invalid (apart
+            # from their own validators) but removing a field from a record
+            # can
+            if _element_types(thetype) is not None:
+                ancestors.append((thetype, value, None))
+                thetype = None
+            break
+        child = _child(thetype, value, segment)
+        if child is None:
+            # The type cannot be walked any further so validate from here
+            break
+        ancestors.append((thetype, value, segment))
+        thetype, value, key_type = child
+        if key_type is not None:
+            _check_at(key_type, segment, ancestors)
+    else:
+        depth = len(path)
+    if thetype is not None:
+        _check_at(thetype, value, ancestors)
+        validated.add(path[:depth])
+
+    # The enclosing values are unchanged apart from the subtree that was
+    # just validated so only their own validators need to be run
+    while ancestors:
+        thetype, value, segment = ancestors.pop()
+        resolved = _resolve(thetype)
+        for thetype in (thetype, resolved) if resolved is not thetype else (thetype,):
+            if thetype.validator is not None:
+                try:
+                    thetype.validator(thetype, value, None)
+                except errors.ValidationError as ve:
+                    raise _at(ve, ancestors)
+
+def _at(ve, ancestors):
+    for _, _, segment in reversed(ancestors):
+        ve.add_segment(segment)
+    return ve
+
+def _check_at(thetype, value, ancestors):
+    try:
+        checkers.compiled(thetype)(value)
+    except errors.ValidationError as ve:
+        raise _at(ve, ancestors)
+
+def _resolve(thetype):
+    if isinstance(thetype, core.TypeApp) and not isinstance(thetype.root_type, core.NativeType):
+        return thetype.concrete
+    return thetype
+
+def _element_types(thetype):
+    """ Returns (key type, value type) of arrays and maps (where the key
+    type of arrays is None). """
+    thetype = _resolve(thetype)
+    if isinstance(thetype, core.TypeApp):
+        if thetype.root_type in (defaults.Array, defaults.List):
+            return None, thetype.param_values.get("T")
+        if thetype.root_type is defaults.Map:
+            return thetype.param_values.get("K"), thetype.param_values.get("V")
+    return None
+
+def _child(thetype, value, segment):
+    """ Returns (type, value, key type) of a child of a value or None if
+    the child cannot be found through the type. """
+    resolved = _resolve(thetype)
+    try:
+        if isinstance(resolved, core.RecordType):
+            if segment not in resolved.child_indexes: return None
+            return resolved.child_types[resolved.child_indexes[segment]], value[segment], None
+        if isinstance(resolved, core.UnionType):
+            if type(value) is not dict or list(value.keys()) != [segment]: return None
+            return resolved.child_types[resolved.child_indexes[segment]], value[segment], None
+        if isinstance(resolved, core.TupleType):
+            index = int(segment)
+            return resolved.child_types[index], value[index], None
+        element_types = _element_types(resolved)
+        if element_types is not None:
+            key_type, value_type = element_types
+            if key_type is None:
+                segment = int(segment)
+            return value_type, value[segment], key_type
+    except (KeyError, IndexError, TypeError, ValueError):
+        pass
+    return None
+
+class Tracker(object):
+    """ Records the paths of changes made to a (validated) value through a
+    proxy so the value can be revalidated incrementally:
+
+        tracker = Tracker(config)
+        tracker.value["server"]["port"] = 8080
+        del tracker.value["debug"]
+        tracker.revalidate(Config)
+
+    Only changes made through the proxy (or proxies of values read through
+    it) are recorded.  Inserting or deleting elements of a list shifts the
+    indexes of the elements after them so these are recorded as a change to
+    the whole list, and proxies of elements read before such a change must
+    not be used after it.
+    """
+    def __init__(self, value):
+        self.target = value
+        self.changes = []
+        self.value = _proxy(self, value, ())
+
+    def record(self, op, path):
+        self.changes.append({"op": op, "path": list(path)})
+
+    def clear(self):
+        self.changes = []
+
+    def revalidate(self, thetype, fail_fast = True):
+        """ Revalidates the value with the changes made since the last call
+        and clears the changes if it is valid. """
+        revalidate(thetype, self.target, self.changes, fail_fast)
+        self.clear()
+
+def _proxy(tracker, value, path):
+    if type(value) is dict:
+        return TrackedDict(tracker, value, path)
+    if type(value) is list:
+        return TrackedList(tracker, value, path)
+    return value
+
+class _Tracked(object):
+    __slots__ = ("_tracker", "_target", "_path")
+
+    def __init__(self, tracker, target, path):
+        self._tracker = tracker
+        self._target = target
+        self._path = path
+
+    def __getitem__(self, key):
+        return _proxy(self._tracker, self._target[key], self._path + (key,))
+
+    def __len__(self):
+        return len(self._target)
+
+    def __iter__(self):
+        return iter(self._target)
+
+    def __contains__(self, item):
+        return item in self._target
+
+    def __eq__(self, other):
+        if isinstance(other, _Tracked): other = other._target
+        return self._target == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._target)
+
+    def _changed(self, key):
+        self._tracker.record(REPLACE, self._path + (key,))
+
+    def _removed(self, key):
+        self._tracker.record(REMOVE, self._path + (key,))
+
+class TrackedDict(_Tracked):
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        self._target[key] = value
+        self._changed(key)
+
+    def __delitem__(self, key):
+        del self._target[key]
+        self._removed(key)
+
+    def get(self, key, default = None):
+        return self[key] if key in self._target else default
+
+    def keys(self):
+        return self._target.keys()
+
+    def values(self):
+        return [self[key] for key in self._target]
+
+    def items(self):
+        return [(key, self[key]) for key in self._target]
+
+    def pop(self, key, *default):
+        if key not in self._target and default:
+            return default[0]
+        value = self._target.pop(key)
+        self._removed(key)
+        return value
+
+    def setdefault(self, key, default = None):
+        if key not in self._target:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key,value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        for key in list(self._target):
+            del self[key]
+
+class TrackedList(_Tracked):
+    __slots__ = ()
+
+    def __setitem__(self, index, value):
+        self._target[index] = value
+        if isinstance(index, slice):
+            # Elements may have been added anywhere
+            self._tracker.record(REPLACE, self._path)
+        else:
+            self._changed(index % len(self._target))
+
+    def _shifted(self):
+        """ Records a change to the whole list as indexes recorded so far
+        may now refer to other elements. """
+        self._tracker.record(REPLACE, self._path)
+
+    def __delitem__(self, index):
+        del self._target[index]
+        self._shifted()
+
+    def append(self, value):
+        self._target.append(value)
+        self._changed(len(self._target) - 1)
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def insert(self, index, value):
+        self._target.insert(index, value)
+        if index >= len(self._target) - 1:
+            self._changed(len(self._target) - 1)
+        else:
+            self._shifted()
+
+    def pop(self, index = -1):
+        size = len(self._target)
+        value = self._target.pop(index)
+        if index in (-1, size - 1):
+            # Nothing is shifted by removing the last element
+            self._removed(size - 1)
+        else:
+            self._shifted()
+        return value
+
+    def remove(self, value):
+        self._target.remove(value)
+        self._shifted()
+
+    def clear(self):
+        self._target.clear()
+        self._removed(0)
@@ -0,0 +1,378 @@
+
+# Loads type definitions from .tc schema files
+import os
+import re
+import pickle
+import hashlib
+import tempfile
+import typecube
+from typecube import core
+from typecube import defaults
+from typecube import errors
+
+# Bump this whenever the structure of the pickled types changes
+CACHE_FORMAT_VERSION = 3
+CACHE_MAGIC = b"TCC"
+CACHE_HEADER = CACHE_MAGIC + ("%d:%s\n" % (CACHE_FORMAT_VERSION, typecube.__version__)).encode("ascii")
+
+_TOKENS = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<punct>[{}<>(),:;@?=])
+  | (?P<invalid>.)
+""", re.VERBOSE | re.DOTALL)
+
+KEYWORDS = ("namespace", "atomic", "record")
+
+# Types in defaults that atomics are bound to (by their lower cased names)
+# so they get the validators and mapper functors of the defaults
+BUILTINS = {
+    "byte": defaults.Byte,
+    "char": defaults.Char,
+    "int": defaults.Int,
+    "integer": defaults.Int,
+    "long": defaults.Long,
+    "float": defaults.Float,
+    "double": defaults.Double,
+    "string": defaults.String,
+    "text": defaults.String,
+    "array": defaults.Array,
+    "list": defaults.List,
+    "map": defaults.Map,
+}
+
+class Token(object):
+    def __init__(self, kind, value, line, column):
+        self.kind = kind
+        self.value = value
+        self.line = line
+        self.column = column
+
+    def __repr__(self):
+        return "<Token %s '%s' at %d:%d>" % (self.kind, self.value, self.line, self.column)
+
+def tokenize(text):
+    """ Returns the tokens in the source of a .tc file.  Whitespace and
+    comments are dropped. """
+    tokens = []
+    line, line_start = 1, 0
+    for match in _TOKENS.finditer(text):
+        kind, value = match.lastgroup, match.group()
+        column = match.start() - line_start + 1
+        if kind == "invalid":
+            raise errors.ParseError("Unexpected character '%s'" % value, line, column)
+        if kind not in ("space", "comment"):
+            tokens.append(Token(kind, value, line, column))
+        newlines = value.count("\n")
+        if newlines:
+            line += newlines
+            line_start = match.start() + value.rindex("\n") + 1
+    return tokens
+
+class Parser(object):
+    """ Parses the source of a .tc file into declarations which are then
+    turned into types.  The supported grammar is:
+
+        file        := namespace*
+        namespace   := "namespace" NAME "{" (annotation* (atomic | record))* "}"
+        atomic      := "atomic" NAME params? ";"?
+        record      := "record" params? NAME params? (":" typeref)? "{" field* "}" ";"?
+        field       := annotation* NAME ":" typeref ("=" literal)? ";"?
+        typeref     := NAME ("<" typeref ("," typeref)* ">")? "?"?
+                     | "(" typeref ("," typeref)* ")" "?"?
+        params      := "<" NAME ("," NAME)* ">"
+        annotation  := "@" NAME ("(" ... ")")?
+        literal     := STRING | NUMBER | NAME
+
+    Annotations, optional markers ("?") and default values are parsed but
+    not (yet) reflected in the types.
+    """
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, value = None):
+        if self.pos >= len(self.tokens): return None
+        token = self.tokens[self.pos]
+        if value is not None and token.value != value: return None
+        return token
+
+    def next(self, value = None, kind = None):
+        token = self.peek()
+        if token is None:
+            last = self.tokens[-1] if self.tokens else Token(None, "", 1, 0)
+            raise errors.ParseError("Unexpected end of input", last.line, last.column + len(last.value))
+        if (value is not None and token.value != value) or (kind is not None and token.kind != kind):
+            raise errors.ParseError("Expected %s, found '%s'" % (value and "'%s'" % value or kind, token.value), token.line, token.column)
+        self.pos += 1
+        return token
+
+    def next_if(self, value):
+        token = self.peek(value)
+        if token is not None: self.pos += 1
+        return token
+
+    def next_name(self, dotted = False):
+        token = self.next(kind = "name")
+        if token.value in KEYWORDS or (not dotted and "." in token.value):
+            raise errors.ParseError("Invalid name '%s'" % token.value, token.line, token.column)
+        return token
+
+    def parse(self):
+        """ Returns a list of namespace declarations. """
+        namespaces = []
+        while self.peek():
+            namespaces.append(self.parse_namespace())
+        return namespaces
+
+    def parse_namespace(self):
+        self.next("namespace")
+        name = self.next_name(True)
+        self.next("{")
+        declarations = []
+        while not self.next_if("}"):
+            self.skip_annotations()
+            if self.peek("atomic"):
+                declarations.append(self.parse_atomic())
+            elif self.peek("record"):
+                declarations.append(self.parse_record())
+            else:
+                token = self.next()
+                raise errors.ParseError("Expected a declaration, found '%s'" % token.value, token.line, token.column)
+        return ("namespace", name.value, declarations)
+
+    def skip_annotations(self):
+        while self.next_if("@"):
+            self.next_name(True)
+            if self.next_if("("):
+                depth = 1
+                while depth:
+                    token = self.next()
+                    if token.kind == "punct" and token.value in "()":
+                        depth += 1 if token.value == "(" else -1
+
+    def parse_params(self):
+        params = []
+        if self.next_if("<"):
+            params.append(self.next_name().value)
+            while self.next_if(","):
+                params.append(self.next_name().value)
+            self.next(">")
+        return params
+
+    def parse_atomic(self):
+        self.next("atomic")
+        name = self.next_name()
+        params = self.parse_params()
+        self.next_if(";")
+        return ("atomic", name, params)
+
+    def parse_record(self):
+        self.next("record")
+        params = self.parse_params()
+        name = self.next_name()
+        params = params + self.parse_params()
+        base = None
+        if self.next_if(":"):
+            base = self.parse_typeref()
+        self.next("{")
+        fields = []
+        while not self.next_if("}"):
+            self.skip_annotations()
+            field_name = self.next_name()
+            self.next(":")
+            fields.append((field_name, self.parse_typeref()))
+            if self.next_if("="):
+                self.parse_literal()
+            self.next_if(";")
+        self.next_if(";")
+        return ("record", name, params, base, fields)
+
+    def parse_literal(self):
+        token = self.next()
+        if token.kind not in ("string", "number", "name"):
+            raise errors.ParseError("Expected a literal, found '%s'" % token.value, token.line, token.column)
+        return token
+
+    def parse_typeref(self):
+        if self.peek("("):
+            token = self.next("(")
+            children = [self.parse_typeref()]
+            while self.next_if(","):
+                children.append(self.parse_typeref())
+            self.next(")")
+            self.next_if("?")
+            return ("tuple", token, children)
+        name = self.next_name(True)
+        args = []
+        if self.next_if("<"):
+            args.append(self.parse_typeref())
+            while self.next_if(","):
+                args.append(self.parse_typeref())
+            self.next(">")
+        self.next_if("?")
+        return ("ref", name, args)
+
+class Builder(object):
+    """ Builds types out of parsed declarations into a root namespace.
+
+    Atomics whose (lower cased) names are in builtins and that take as many
+    params are bound to the builtin types, other atomics are created as
+    natives without validators.
+    """
+    def __init__(self, root = None, builtins = None):
+        self.root = root or core.Namespace("")
+        self.builtins = BUILTINS if builtins is None else builtins
+        self.pending = {}
+        self.building = set()
+
+    def build(self, namespaces):
+        # Declare all types first so types can be referred to before they
+        # are declared
+        records = []
+        for _, name, declarations in namespaces:
+            namespace = self.root.ensure(name)
+            for declaration in declarations:
+                kind, name_token, params = declaration[:3]
+                existing = namespace.types.get(name_token.value, None)
+                if kind == "atomic" and isinstance(existing, core.NativeType) and len(existing.args) == len(params):
+                    # Atomics can be declared more than once
+                    continue
+                if existing is not None:
+                    raise errors.ParseError("Duplicate type '%s'" % name_token.value, name_token.line, name_token.column)
+                if kind == "atomic":
+                    namespace.add_type(name_token.value, self.atomic(name_token.value, params))
+                else:
+                    record = core.RecordType(name_token.value, params)
+                    namespace.add_type(name_token.value, record)
+                    self.pending[record] = (namespace, declaration)
+                    records.append(record)
+        for record in records:
+            self.build_record(record)
+        return self.root
+
+    def atomic(self, name, params):
+        builtin = self.builtins.get(name.lower(), None)
+        if builtin is not None and len(builtin.args) == len(params):
+            return builtin
+        return core.NativeType(name, params)
+
+    def build_record(self, record):
+        if record not in self.pending: return
+        namespace, (_, name, params, base, fields) = self.pending.pop(record)
+        self.building.add(record)
+        if base is not None:
+            base_type = self.resolve(base, namespace, params)
+            base_record = base_type.root_type if isinstance(base_type, core.TypeApp) else base_type
+            if not isinstance(base_record, core.RecordType):
+                raise errors.ParseError("Base of '%s' is not a record" % name.value, name.line, name.column)
+            if base_record in self.building:
+                raise errors.ParseError("Record '%s' cannot extend itself" % name.value, name.line, name.column)
+            self.build_record(base_record)
+            if isinstance(base_type, core.TypeApp):
+                base_type = base_type.concrete
+            for child_type, child_name in zip(base_type.child_types, base_type.child_names):
+                record.add(child_type, child_name)
+        for field_name, typeref in fields:
+            if record.name_exists(field_name.value):
+                raise errors.ParseError("Duplicate field '%s'" % field_name.value, field_name.line, field_name.column)
+            record.add(self.resolve(typeref, namespace, params), field_name.value)
+        self.building.remove(record)
+
+    def resolve(self, typeref, namespace, params):
+        """ Returns the type referred to by a type reference from within a
+        namespace.  Names are looked up in the params of the enclosing
+        record, then the enclosing namespaces and finally from the root. """
+        kind, token, args = typeref
+        if kind == "tuple":
+            tuple_type = core.TupleType(None)
+            for child in args:
+                tuple_type.add(self.resolve(child, namespace, params))
+            return tuple_type
+        name = token.value
+        if name in params:
+            thetype = core.TypeVar(name)
+        else:
+            thetype = None
+            current = namespace
+            while thetype is None and current is not None:
+                thetype = current.find_type(name)
+                current = current.parent
+        if thetype is None:
+            raise errors.ParseError("Unknown type '%s'" % name, token.line, token.column)
+        if args:
+            if len(args) != len(thetype.args):
+                raise errors.ParseError("Type '%s' expects %d args, found %d" % (name, len(thetype.args), len(args)), token.line, token.column)
+            thetype = thetype[[self.resolve(arg, namespace, params) for arg in args]]
+        return thetype
+
+def load_string(text, root = None, builtins = None):
+    """ Parses the source of a .tc file and returns the root namespace with
+    the types that were declared.  See Builder for builtins. """
+    return Builder(root, builtins).build(Parser(text).parse())
+
+def load_file(path, cache_dir = None):
+    """ Loads the types declared in a .tc file and returns the root
+    namespace they were declared in.
+
+    If a cache_dir is provided the parsed types are cached there keyed by
+    a hash of the contents of the file, so loading the same contents again
+    (by this version of typecube) skips parsing.  Atomics are bound to the
+    default BUILTINS.
+    """
+    with open(path, "rb") as infile:
+        contents = infile.read()
+    if cache_dir is None:
+        return load_string(contents.decode("utf-8"))
+
+    cache_path = os.path.join(cache_dir, hashlib.sha256(contents).hexdigest() + ".tcc")
+    root = _read_cache(cache_path)
+    if root is None:
+        root = load_string(contents.decode("utf-8"))
+        _write_cache(cache_path, root)
+    return root
+
+# Builtins are pickled by name so cached types refer to the same builtins
+_BUILTIN_NAMES = dict((id(thetype), name) for name,thetype in BUILTINS.items())
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        name = _BUILTIN_NAMES.get(id(obj), None)
+        if name is not None and BUILTINS.get(name, None) is obj:
+            return name
+        return None
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, name):
+        try:
+            return BUILTINS[name]
+        except KeyError:
+            raise pickle.UnpicklingError("Unknown builtin '%s'" % name)
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as infile:
+            if infile.read(len(CACHE_HEADER)) != CACHE_HEADER:
+                return None
+            return _Unpickler(infile).load()
+    except (IOError, OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def _write_cache(cache_path, root):
+    cache_dir = os.path.dirname(cache_path)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # Write to a temporary file first so concurrent loaders never see
+    # partially written caches
+    fd, temp_path = tempfile.mkstemp(dir = cache_dir, suffix = ".tmp")
+    try:
+        with os.fdopen(fd, "wb") as outfile:
+            outfile.write(CACHE_HEADER)
+            _Pickler(outfile, pickle.HIGHEST_PROTOCOL).dump(root)
+        os.replace(temp_path, cache_path)
+    except:
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,79 @@
+
+# Validation of large datasets across a pool of worker processes
+import os
+import pickle
+import itertools
+import collections
+import multiprocessing
+from typecube import checkers
+from typecube import errors
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# The checker for the type being validated within a worker process
+_worker_check = None
+
+def _init_worker(pickled_type):
+    global _worker_check
+    _worker_check = checkers.compile(pickle.loads(pickled_type))
+
+def _check_chunk(start, values, fail_fast):
+    failures = []
+    for index,value in enumerate(values, start):
+        try:
+            _worker_check(value)
+        except errors.ValidationError as ve:
+            failures.append((index, ve))
+            if fail_fast: break
+    return failures
+
+def _chunks(values, chunksize):
+    values = iter(values)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(values, chunksize))
+        if not chunk: return
+        yield start, chunk
+        start += len(chunk)
+
+def type_check_parallel(thetype, values, workers = None, chunksize = DEFAULT_CHUNK_SIZE, fail_fast = False, mp_context = None):
+    """ Checks that every value in an iterable conforms to the type provided
+    using a pool of worker processes.
+
+    The type is sent (pickled) to each worker once and compiled there, so
+    any validators on it must be picklable (eg module level functions).
+    Values are sent to the workers in chunks of chunksize, with only a few
+    chunks per worker in flight at a time so the iterable is consumed as it
+    is validated.
+
+    Returns a list of (index, ValidationError) tuples in the order of the
+    values.  If fail_fast is True then validation stops at the first value
+    that does not conform and only its error is returned.
+
+    Note that unlike type_check and type_check_many, fail_fast is False by
+    default and failures are returned rather than raised: datasets large
+    enough to be worth validating in parallel are usually checked to find
+    all the values that need fixing.
+    """
+    workers = workers or os.cpu_count() or 1
+    context = mp_context or multiprocessing.get_context()
+    pool = context.Pool(workers, _init_worker, (pickle.dumps(thetype, pickle.HIGHEST_PROTOCOL),))
+    failures = []
+    try:
+        pending = collections.deque()
+        chunks = _chunks(values, chunksize)
+        while True:
+            # Keep the workers busy without reading ahead too far
+            while len(pending) < 2 * workers:
+                chunk = next(chunks, None)
+                if chunk is None: break
+                pending.append(pool.apply_async(_check_chunk, (chunk[0], chunk[1], fail_fast)))
+            if not pending: break
+            failures.extend(pending.popleft().get())
+            if fail_fast and failures:
+                return failures[:1]
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return failures
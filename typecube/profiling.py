@@ -0,0 +1,169 @@
+
+# Opt-in profiling of how much time is spent validating each type
+import time
+import threading
+from typecube import checkers
+from typecube import errors
+
+class TypeStats(object):
+    """ Validation statistics for a single type. """
+    __slots__ = ("thetype", "calls", "failures", "cumulative_time", "self_time")
+
+    def __init__(self, thetype):
+        self.thetype = thetype
+        self.calls = 0
+        self.failures = 0
+        self.cumulative_time = 0.0
+        self.self_time = 0.0
+
+    @property
+    def name(self):
+        return _label(self.thetype)
+
+class _Frame(object):
+    __slots__ = ("stats", "path", "start", "child_time")
+
+    def __init__(self, stats, path, start):
+        self.stats = stats
+        self.path = path
+        self.start = start
+        self.child_time = 0.0
+
+def _label(thetype):
+    return thetype.name or thetype.__class__.__name__
+
+class Profiler(object):
+    """ Records call counts, cumulative and self times and failure counts
+    per type (by identity) while validating with checkers.type_check and
+    with checkers compiled while the profiler is enabled.
+
+    Nothing is instrumented until the profiler is enabled: enabling it sets
+    checkers.check_hook (which type_check reports every type it checks to,
+    memoized or not) and has compile wrap the checker of each type.
+    Disabling clears both and drops the checkers cached by
+    checkers.compiled so these are compiled again without profiling.  Note
+    that checkers returned by checkers.compile while the profiler was
+    enabled remain profiled (into this profiler) until they are discarded.
+    Only one profiler can be enabled at a time.  Each thread has its own
+    stack of types being checked, but the counters of the types are shared
+    (and updated without locking).
+
+        with Profiler() as profiler:
+            checkers.type_check(MyType, data)
+        print(profiler.table())
+    """
+    _active = None
+
+    def __init__(self):
+        self.stats = {}
+        self.stacks = {}
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def enable(self):
+        if Profiler._active is not None:
+            raise errors.TCException("Another profiler is already enabled")
+        Profiler._active = self
+        checkers.check_hook = self
+        checkers.instrument_compiled = self.instrument
+        return self
+
+    def disable(self):
+        if Profiler._active is self:
+            checkers.check_hook = None
+            checkers.instrument_compiled = None
+            checkers.clear_compiled()
+            Profiler._active = None
+        return self
+
+    def reset(self):
+        self.stats = {}
+        self.stacks = {}
+
+    def instrument(self, thetype, check):
+        """ Returns a profiled version of the checker compiled for a type. """
+        profiler = self
+        def profiled_check(data):
+            return profiler.call(thetype, check, data)
+        python_types = getattr(check, "python_types", None)
+        if python_types is not None:
+            # Keep bulk checks of natives working, these are then not
+            # counted per value as they are not called per value
+            profiled_check.python_types = python_types
+        return profiled_check
+
+    def call(self, thetype, function, *args, **kwargs):
+        """ Calls a function that validates a value against a type while
+        recording it against the type. """
+        self.enter(thetype)
+        try:
+            result = function(*args, **kwargs)
+        except errors.ValidationError:
+            self.exit(thetype, True)
+            raise
+        except:
+            self.exit(thetype, False)
+            raise
+        self.exit(thetype, False)
+        return result
+
+    def enter(self, thetype):
+        """ Starts timing the validation of a value against a type. """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stats = self.stats.get(id(thetype), None)
+        if stats is None:
+            stats = self.stats[id(thetype)] = TypeStats(thetype)
+        parent = stack[-1] if stack else None
+        path = (parent.path if parent else ()) + (_label(thetype),)
+        stack.append(_Frame(stats, path, time.perf_counter()))
+
+    def exit(self, thetype, failed):
+        """ Stops timing the validation of the value entered last. """
+        stack = self._local.stack
+        frame = stack.pop()
+        elapsed = time.perf_counter() - frame.start
+        stats = frame.stats
+        if failed: stats.failures += 1
+        stats.calls += 1
+        stats.self_time += elapsed - frame.child_time
+        # Only count time once for recursive types
+        if not any(other.stats is stats for other in stack):
+            stats.cumulative_time += elapsed
+        if stack:
+            stack[-1].child_time += elapsed
+        self.stacks[frame.path] = self.stacks.get(frame.path, 0.0) + elapsed - frame.child_time
+
+    def sorted_stats(self, sort_by = "self_time"):
+        return sorted(self.stats.values(), key = lambda stats: getattr(stats, sort_by), reverse = True)
+
+    def table(self, sort_by = "self_time", limit = None):
+        """ Returns the statistics of each type as a table. """
+        lines = ["%10s %10s %14s %14s  %s" % ("calls", "failures", "cumulative(ms)", "self(ms)", "type")]
+        for stats in self.sorted_stats(sort_by)[:limit]:
+            lines.append("%10d %10d %14.3f %14.3f  %s (0x%x)" % (stats.calls, stats.failures,
+                            stats.cumulative_time * 1000, stats.self_time * 1000, stats.name, id(stats.thetype)))
+        return "\n".join(lines)
+
+    def collapsed_stacks(self):
+        """ Returns the self time (in microseconds) of each stack of types in
+        the "collapsed" format used by flamegraph tools, eg:
+
+            Order;Array;Item 1200
+        """
+        lines = []
+        for path,self_time in sorted(self.stacks.items()):
+            lines.append("%s %d" % (";".join(path), round(self_time * 1e6)))
+        return "\n".join(lines)
+
+    def write_collapsed(self, path):
+        """ Writes the collapsed stacks to a file (eg for flamegraph.pl). """
+        with open(path, "w") as outfile:
+            outfile.write(self.collapsed_stacks())
+            outfile.write("\n")
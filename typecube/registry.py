@@ -0,0 +1,101 @@
+
+# A registry of types that can be looked up by their fully qualified names
+from sys import intern
+from typecube import core
+from typecube import errors
+
+class Registry(object):
+    """ A registry of types organized as a tree (trie) of namespaces.
+
+    Fully qualified names are resolved one (interned) component at a time
+    through the namespace tree so the cost of a lookup depends only on the
+    depth of the name and not on how many namespaces or types exist.
+    Resolutions of names relative to a namespace are cached until the
+    registry changes.
+
+    Loaders can be registered for namespaces so that the types in a
+    namespace are only loaded when a name in it is first resolved.
+    """
+    def __init__(self, root = None):
+        self.root = root or core.Namespace("")
+        self._loaders = {}
+        self._loading = set()
+        self._resolved = {}
+
+    def namespace(self, fqn):
+        """ Returns the namespace with the given fully qualified name,
+        creating it and its parents if they do not exist. """
+        return self.root.ensure(fqn) if fqn else self.root
+
+    def register(self, fqn, thetype):
+        """ Registers a type by its fully qualified name. """
+        namespace, _, name = fqn.rpartition(".")
+        self.namespace(namespace).add_type(intern(name), thetype)
+        self._resolved.clear()
+        return thetype
+
+    def mount(self, root):
+        """ Adds all the types in a namespace tree (eg as returned by the
+        loader module) to this registry. """
+        def visit(source, target):
+            for name,thetype in source.types.items():
+                target.add_type(intern(name), thetype)
+            for name,child in source.children.items():
+                visit(child, self.namespace(_join(target.fqn, name)))
+        visit(root, self.root)
+        self._resolved.clear()
+        return self
+
+    def add_loader(self, fqn, loader):
+        """ Registers a function to be called (with this registry) the first
+        time a name in the given namespace or any of its children is
+        resolved.  The loader is expected to register the types of the
+        namespace.  If it raises it is run again on the next resolution. """
+        key = tuple(fqn.split("."))
+        if key in self._loaders:
+            raise errors.TCException("Loader for namespace '%s' already exists" % fqn)
+        self._loaders[key] = loader
+        self._resolved.clear()
+        return self
+
+    def find(self, fqn):
+        """ Returns the type with the given fully qualified name or None if
+        it does not exist.  Pending loaders for the namespaces along the
+        way are run first. """
+        if self._loaders:
+            self._run_loaders(fqn.split("."))
+        return self.root.find_type(fqn)
+
+    def resolve(self, name, namespace = ""):
+        """ Resolves a (possibly dotted) name relative to a namespace.  The
+        name is looked up in the namespace first and then in each of its
+        enclosing namespaces up to the root.  Raises a TCException if the
+        name cannot be resolved. """
+        key = (namespace, name)
+        thetype = self._resolved.get(key, None)
+        if thetype is None:
+            scope = namespace
+            while thetype is None:
+                thetype = self.find(_join(scope, name))
+                if not scope: break
+                scope = scope.rpartition(".")[0]
+            if thetype is None:
+                raise errors.TCException("Type '%s' not found from namespace '%s'" % (name, namespace))
+            self._resolved[key] = thetype
+        return thetype
+
+    def _run_loaders(self, parts):
+        for index in range(len(parts)):
+            key = tuple(parts[:index + 1])
+            loader = self._loaders.get(key, None)
+            # Loaders may resolve names in their own namespace
+            if loader is not None and key not in self._loading:
+                self._loading.add(key)
+                try:
+                    loader(self)
+                finally:
+                    self._loading.discard(key)
+                del self._loaders[key]
+
+def _join(namespace, name):
+    return namespace + "." + name if namespace else name
@@ -0,0 +1,207 @@
+
+# Validation of JSON documents while they are being read from a stream
+import re
+import json
+import codecs
+from typecube import core
+from typecube import errors
+from typecube import checkers
+from typecube import defaults
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+# Text ending within a value makes the decoder report an error at the start
+# of the part of the value it could not make sense of yet: the start of a
+# literal, the "." or exponent after the digits of a number or the "u" of a
+# unicode escape in a string.
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+_NUMBER_TAIL = re.compile(r"(\.|[eE][-+]?)?\Z")
+_UNICODE_ESCAPE = re.compile(r"u[0-9a-fA-F]{0,4}\Z")
+
+def _chunks(stream, chunk_size):
+    """ Yields non empty chunks of text from a file or socket like stream.
+    Binary streams are decoded as utf-8. """
+    read = getattr(stream, "read", None) or getattr(stream, "recv")
+    decoder = None
+    while True:
+        chunk = read(chunk_size)
+        if not chunk: break
+        if type(chunk) is not str:
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            chunk = decoder.decode(chunk)
+            if not chunk: continue
+        yield chunk
+    if decoder is not None:
+        chunk = decoder.decode(b"", True)
+        if chunk: yield chunk
+
+class _Buffer(object):
+    """ A window of text over a stream that keeps track of the byte offset
+    of the current position.  Only the unconsumed part of the stream is
+    held in memory. """
+    def __init__(self, stream, chunk_size):
+        self.chunks = _chunks(stream, chunk_size)
+        self.text = ""
+        self.pos = 0
+        self.offset = 0
+        self.is_ascii = True
+        self.eof = False
+
+    @property
+    def remaining(self):
+        return len(self.text) - self.pos
+
+    def fill(self, min_remaining = 0):
+        """ Reads more of the stream into the buffer dropping the consumed
+        text.  Returns False if the end of the stream was reached before
+        anything could be read. """
+        chunks = []
+        remaining = self.remaining
+        while not self.eof and (not chunks or remaining < min_remaining):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+            else:
+                chunks.append(chunk)
+                remaining += len(chunk)
+        if not chunks: return False
+        self.text = self.text[self.pos:] + "".join(chunks)
+        self.pos = 0
+        self.is_ascii = self.text.isascii()
+        return True
+
+    def advance(self, end):
+        if self.is_ascii:
+            self.offset += end - self.pos
+        else:
+            self.offset += len(self.text[self.pos:end].encode("utf-8"))
+        self.pos = end
+
+    def peek(self):
+        """ Skips whitespace and returns the next character or None at the
+        end of the stream. """
+        while True:
+            self.advance(_WHITESPACE.match(self.text, self.pos).end())
+            if self.pos < len(self.text): return self.text[self.pos]
+            if not self.fill(): return None
+
+    def expect(self, chars, path):
+        char = self.peek()
+        if char is None or char not in chars:
+            found = "end of stream" if char is None else "'%s'" % char
+            raise errors.StreamValidationError("Expected one of '%s', found %s" % (chars, found), path, self.offset)
+        self.advance(self.pos + 1)
+        return char
+
+    def decode_value(self, path):
+        """ Decodes the next JSON value reading more of the stream as
+        required.  Returns the value and the byte offset it started at. """
+        if self.peek() is None:
+            raise errors.StreamValidationError("Expected a value, found end of stream", path, self.offset)
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+                # A value running up to the end of the buffer (eg a number)
+                # may continue in the next chunk.
+                if end < len(self.text) or self.eof: break
+            except ValueError as exc:
+                if self.eof or not self._is_incomplete(exc):
+                    raise errors.StreamValidationError("Invalid JSON: %s" % exc.msg, path, self.offset)
+            # Grow geometrically so large values are not reparsed too often
+            self.fill(2 * self.remaining)
+        offset = self.offset
+        self.advance(end)
+        return value, offset
+
+    def _is_incomplete(self, exc):
+        """ Returns whether a decoding error is only due to the buffer
+        ending within a value, ie it may go away once more is read. """
+        if exc.msg.startswith("Unterminated string"): return True
+        rest = self.text[exc.pos:]
+        if exc.msg.startswith("Invalid \\uXXXX escape"):
+            return _UNICODE_ESCAPE.match(rest) is not None
+        return _NUMBER_TAIL.match(rest) is not None or \
+                any(literal.startswith(rest) for literal in _LITERALS)
+
+def _element_type(thetype):
+    """ Returns the type of the elements if the type is an array or list. """
+    if isinstance(thetype, core.TypeApp) and thetype.root_type in (defaults.Array, defaults.List):
+        return thetype.param_values.get("T")
+    return None
+
+def _check_value(check, value, path, offset):
+    try:
+        check(value)
+    except errors.ValidationError as ve:
+        raise errors.StreamValidationError(ve.msg, path + ve.path, offset)
+
+def validate_json_stream(thetype, stream, chunk_size = DEFAULT_CHUNK_SIZE):
+    """ Validates a JSON document read from a file or socket like stream.
+
+    If the type is an Array or List then the elements of the top level JSON
+    array are decoded and validated one at a time so memory used does not
+    grow with the number of elements.  Otherwise the whole document is
+    decoded before it is validated.
+
+    Returns the number of values validated (ie elements of the top level
+    array or 1).  Raises a StreamValidationError with the path and byte
+    offset of the first value that is not valid.
+    """
+    buffer = _Buffer(stream, chunk_size)
+    element_type = _element_type(thetype)
+    if element_type is None:
+        value, offset = buffer.decode_value([])
+        _check_value(checkers.compile(thetype), value, [], offset)
+        count = 1
+    else:
+        if thetype.validator or thetype.root_type.validator:
+            # Validators on the array itself would need the whole array
+            raise errors.ValidationError("Validators on %s cannot be applied to a stream" % repr(thetype))
+        check = checkers.compile(element_type)
+        buffer.expect("[", [])
+        count = 0
+        if buffer.peek() == "]":
+            buffer.advance(buffer.pos + 1)
+        else:
+            while True:
+                path = [count]
+                value, offset = buffer.decode_value(path)
+                _check_value(check, value, path, offset)
+                count += 1
+                if buffer.expect(",]", path) == "]": break
+    if buffer.peek() is not None:
+        raise errors.StreamValidationError("Unexpected data after JSON document", [], buffer.offset)
+    return count
+
+def validate_ndjson_stream(thetype, stream, chunk_size = DEFAULT_CHUNK_SIZE):
+    """ Validates newline delimited JSON read from a file or socket like
+    stream, where each (non blank) line is a value of the given type.
+
+    Returns the number of values validated.  Raises a StreamValidationError
+    with the path and byte offset of the first value that is not valid.
+    """
+    buffer = _Buffer(stream, chunk_size)
+    check = checkers.compile(thetype)
+    count = 0
+    while True:
+        end = buffer.text.find("\n", buffer.pos)
+        if end < 0:
+            if buffer.fill(2 * buffer.remaining + 1): continue
+            end = len(buffer.text)
+        line = buffer.text[buffer.pos:end]
+        offset = buffer.offset
+        if line.strip():
+            path = [count]
+            try:
+                value = json.loads(line)
+            except ValueError as exc:
+                raise errors.StreamValidationError("Invalid JSON: %s" % exc, path, offset)
+            _check_value(check, value, path, offset)
+            count += 1
+        if end >= len(buffer.text):
+            return count
+        buffer.advance(end + 1)
@@ -1,11 +1,13 @@
 
+from sys import intern
+
 class FQN(object):
+    __slots__ = ("_name", "_namespace", "_fqn")
+
     def __init__(self, name, namespace, ensure_namespaces_are_equal = True):
         name,namespace = (name or "").strip(), (namespace or "").strip()
-        comps = name.split(".")
-        if len(comps) > 1:
-            n2 = comps[-1]
-            ns2 = ".".join(comps[:-1])
+        ns2, dot, n2 = name.rpartition(".")
+        if dot:
             if ensure_namespaces_are_equal:
                 if namespace and ns2 != namespace:
                     assert ns2 == namespace or not namespace, "Namespaces dont match '%s' vs '%s'" % (ns2, namespace)
@@ -15,9 +17,10 @@ class FQN(object):
             fqn = namespace + "." + name
         elif name:
             fqn = name
-        self._name = name
-        self._namespace = namespace
-        self._fqn = fqn
+        # Names are compared a lot so intern them
+        self._name = intern(name)
+        self._namespace = intern(namespace)
+        self._fqn = fqn and intern(fqn)
 
     @property
     def parts(self):
@@ -35,3 +38,9 @@ class FQN(object):
     def fqn(self):
         return self._fqn
 
+def all_of_type(values, python_type):
+    """ Returns True if every value is of exactly the given python type.
+    The types are gathered in a single pass without calling back into
+    python code for each value. """
+    types = set(map(type, values))
+    return not types or types == {python_type}
@@ -0,0 +1,101 @@
+
+# Lazily validated views over records
+from typecube import core
+from typecube import checkers
+from typecube import errors
+
+def _record_type(thetype):
+    if isinstance(thetype, core.TypeApp) and not isinstance(thetype.root_type, core.NativeType):
+        thetype = thetype.concrete
+    if isinstance(thetype, core.RecordType) and not thetype.args:
+        return thetype
+    return None
+
+class RecordView(object):
+    """ A view over a dict that is validated against a record type lazily.
+
+    Each field is validated (with a checker compiled for its type) the first
+    time it is accessed, either as an item or as an attribute, and the
+    result is cached.  Fields that are records are returned as views
+    themselves so only the parts of a large document that are actually read
+    are validated.  Call _validate() to validate the rest.
+
+    Methods and attributes of views start with an underscore (like those
+    of generated classes) so they do not hide fields, eg the (unvalidated)
+    data being viewed is _data.  Note that it must not be changed while it
+    is viewed.
+
+        order = RecordView(Order, payload)
+        order.customer.name     # only validates customer.name
+        order._validate()       # validates everything else
+    """
+    __slots__ = ("_type", "_data", "_path", "_values", "_validated")
+
+    def __init__(self, thetype, data, path = ()):
+        record_type = _record_type(thetype)
+        if record_type is None:
+            raise errors.TCException("Views can only be created for records without unbound args")
+        self._path = path
+        if not isinstance(data, dict):
+            raise self._error(errors.ValidationError("%s needs to be a dict, found %s" % (str(data), str(type(data)))))
+        self._type = record_type
+        self._data = data
+        self._values = {}
+        self._validated = False
+
+    def _error(self, ve):
+        for segment in reversed(self._path):
+            ve.add_segment(segment)
+        return ve
+
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        index = self._type.child_indexes.get(name, None)
+        if index is None:
+            raise KeyError("Field '%s' not found in record: %s" % (name, self._type.name))
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise self._error(errors.ValidationError("Field is missing", [name]))
+        child_type = self._type.child_types[index]
+        if _record_type(child_type) is not None:
+            value = RecordView(child_type, value, self._path + (name,))
+        else:
+            try:
+                checkers.compiled(child_type)(value)
+            except errors.ValidationError as ve:
+                raise self._error(ve.add_segment(name))
+        self._values[name] = value
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self._type.child_indexes:
+            raise AttributeError(name)
+        return self[name]
+
+    def __contains__(self, name):
+        return name in self._type.child_indexes
+
+    def __repr__(self):
+        return "<RecordView(%s) of %d/%d fields>" % (self._type.name, len(self._values), len(self._type.child_names))
+
+    def _validate(self):
+        """ Validates all fields that have not been accessed yet (including
+        those in nested views) as well as the validator of the record
+        itself and returns the view. """
+        if not self._validated:
+            for name in self._type.child_names:
+                value = self[name]
+                if isinstance(value, RecordView):
+                    value._validate()
+            validator = self._type.validator
+            if validator is not None:
+                try:
+                    validator(self._type, self._data, None)
+                except errors.ValidationError as ve:
+                    raise self._error(ve)
+            self._validated = True
+        return self